@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Persistent ESP32-CAM Discovery Cache
+Remembers where cameras were last found (address, MAC address and /status
+response time) in a small JSON file. On the next run every remembered camera
+is revalidated at once, including at a new IP if the ARP table shows its MAC
+address moved, and the full network scan only runs when all of them miss.
+
+Usage: python discovery_cache.py [--rescan] [--clear] [--network 192.168.0.0/22 ...]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+from esp32_discovery import DEFAULT_PORTS, camera_address, discover, probe, split_address
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.iris', 'esp32_cache.json')
+DEFAULT_TTL = 7 * 24 * 3600  # seconds since a camera was last confirmed
+REVALIDATE_TIMEOUT = 0.5  # a camera on the LAN answers /status in tens of milliseconds
+
+_MAC = re.compile(r'([0-9a-f]{1,2}[:-]){5}[0-9a-f]{1,2}', re.IGNORECASE)
+_IP = re.compile(r'\b(\d{1,3}(?:\.\d{1,3}){3})\b')
+
+
+def valid_entry(entry):
+    """True if a cache entry has the fields revalidation needs, with usable types"""
+    return (isinstance(entry, dict)
+            and isinstance(entry.get('address'), str)
+            and isinstance(entry.get('host'), str)
+            and isinstance(entry.get('port'), int)
+            and isinstance(entry.get('last_seen', 0), (int, float)))
+
+
+def arp_table():
+    """Current IP -> MAC address mapping from the OS neighbour cache ({} if unavailable)"""
+    table = {}
+    try:
+        with open('/proc/net/arp') as f:
+            for line in f.readlines()[1:]:
+                fields = line.split()
+                if len(fields) >= 4 and fields[3] != '00:00:00:00:00:00':
+                    table[fields[0]] = fields[3].lower()
+        return table
+    except OSError:
+        pass
+    try:
+        output = subprocess.run(['arp', '-a'], capture_output=True, text=True, timeout=2).stdout
+    except (OSError, subprocess.SubprocessError):
+        return table
+    for line in output.splitlines():
+        ip, mac = _IP.search(line), _MAC.search(line)
+        if ip and mac:
+            # Windows prints aa-bb-..., macOS drops leading zeros; store one canonical form
+            parts = re.split('[:-]', mac.group(0).lower())
+            table[ip.group(1)] = ':'.join(part.zfill(2) for part in parts)
+    return table
+
+
+class DiscoveryCache:
+    """Last-known camera addresses with MAC hints and response times, expiring after a TTL"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.entries = {}  # address -> entry dict
+        self.load()
+
+    def load(self):
+        """Read the cache file, dropping expired or malformed entries"""
+        try:
+            with open(self.path) as f:
+                entries = json.load(f).get('cameras', {})
+        except (OSError, ValueError, AttributeError):
+            entries = {}
+        if not isinstance(entries, dict):
+            entries = {}
+        now = time.time()
+        self.entries = {
+            address: entry for address, entry in entries.items()
+            if valid_entry(entry) and now - entry.get('last_seen', 0) < self.ttl
+        }
+
+    def save(self):
+        """Write the cache atomically so a crash never leaves a half-written file"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': 1, 'cameras': self.entries}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def candidates(self, arp=None):
+        """Addresses to revalidate, most recently seen first, plus new IPs of moved MACs"""
+        arp = arp if arp is not None else {}
+        ip_for_mac = {mac: ip for ip, mac in arp.items()}
+        entries = [entry for entry in self.entries.values() if valid_entry(entry)]
+        ordered = sorted(entries, key=lambda e: e.get('last_seen', 0), reverse=True)
+        addresses = []
+        for entry in ordered:
+            addresses.append(entry['address'])
+            moved_ip = ip_for_mac.get(entry.get('mac'))
+            if moved_ip and moved_ip != entry['host']:
+                addresses.append(camera_address(moved_ip, entry['port']))
+        return list(dict.fromkeys(addresses))
+
+    def record(self, camera, mac=None):
+        """Remember a confirmed camera"""
+        previous = self.entries.get(camera['address'], {})
+        self.entries[camera['address']] = {
+            'address': camera['address'],
+            'host': camera['host'],
+            'port': camera['port'],
+            'mac': mac or previous.get('mac'),
+            'latency_ms': camera['latency_ms'],
+            'last_seen': time.time(),
+            'hits': previous.get('hits', 0) + 1,
+        }
+        # A MAC lives at one address; forget where this camera used to be
+        mac = self.entries[camera['address']]['mac']
+        for address, entry in list(self.entries.items()):
+            if mac and address != camera['address'] and entry.get('mac') == mac:
+                del self.entries[address]
+
+    def clear(self):
+        self.entries = {}
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+async def revalidate(addresses, timeout=REVALIDATE_TIMEOUT):
+    """Probe every address at once; returns the first camera to confirm, or None"""
+    tasks = [asyncio.ensure_future(probe(*split_address(address), timeout)) for address in addresses]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            camera = await next_done
+            if camera is not None:
+                return camera
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def discover_cached(cache, networks=None, ports=DEFAULT_PORTS, refresh=False, **scan_options):
+    """Cached cameras first, then a full scan only if none of them answer; returns (cameras, source)
+
+    source is 'cache' or 'scan'. scan_options are passed on to esp32_discovery.discover.
+    """
+    if not refresh and cache.entries:
+        camera = await revalidate(cache.candidates(arp_table()))
+        if camera is not None:
+            cached_mac = cache.entries.get(camera['address'], {}).get('mac')
+            cache.record(camera, cached_mac or arp_table().get(camera['host']))
+            cache.save()
+            return [camera], 'cache'
+
+    cameras = await discover(networks, ports, **scan_options)
+    if cameras:
+        arp = arp_table()
+        for camera in cameras:
+            cache.record(camera, arp.get(camera['host']))
+        cache.save()
+    return cameras, 'scan'
+
+
+def find_cameras_cached(networks=None, ports=DEFAULT_PORTS, refresh=False, cache_path=DEFAULT_CACHE_PATH,
+                        ttl=DEFAULT_TTL, **scan_options):
+    """Blocking wrapper around discover_cached(); returns the list of camera dicts"""
+    cache = DiscoveryCache(cache_path, ttl)
+    cameras, source = asyncio.run(discover_cached(cache, networks, ports, refresh, **scan_options))
+    if cameras and source == 'cache':
+        print(f"⚡ ESP32-CAM confirmed at cached address {cameras[0]['address']}")
+    return cameras
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Find ESP32-CAM devices, using the discovery cache')
+    parser.add_argument('--network', action='append', help='CIDR to scan on a cache miss (repeatable)')
+    parser.add_argument('--port', type=int, action='append', help='port to probe (repeatable; default: 80)')
+    parser.add_argument('--rescan', action='store_true', help='ignore the cache and scan the network')
+    parser.add_argument('--clear', action='store_true', help='delete the cache file and exit')
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH, help='cache file location')
+    parser.add_argument('--ttl', type=float, default=DEFAULT_TTL, help='seconds a cached camera stays valid')
+    args = parser.parse_args()
+
+    if args.clear:
+        DiscoveryCache(args.cache, args.ttl).clear()
+        print(f"🗑️  Cleared {args.cache}")
+        return 0
+
+    started = time.perf_counter()
+    cameras = find_cameras_cached(args.network, tuple(args.port or DEFAULT_PORTS), args.rescan, args.cache, args.ttl)
+    for camera in cameras:
+        print(f"✅ ESP32-CAM at {camera['address']} ({camera['latency_ms']} ms)")
+    if not cameras:
+        print("❌ No ESP32-CAM found")
+    print(f"Discovery took {time.perf_counter() - started:.2f}s")
+    return 0 if cameras else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
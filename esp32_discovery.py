@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+ESP32-CAM Discovery Engine
+Scans one or more networks (any CIDR, every local interface by default) with
+asyncio, probing thousands of hosts at once. Cameras are recognised from the
+small /status JSON that CameraWebServer serves instead of pulling a full JPEG
+from /capture, and the scan stops at the first confirmed camera unless asked
+for all of them.
+
+Usage: python esp32_discovery.py [--network 192.168.0.0/22 ...] [--port 80 ...] [--all]
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import json
+import socket
+import time
+
+DEFAULT_PORTS = (80,)
+DEFAULT_TIMEOUT = 1.0  # seconds per probe; connection refusals return at once
+DEFAULT_CONCURRENCY = 1024
+MAX_STATUS_BYTES = 8192
+# Keys every CameraWebServer /status response carries
+STATUS_FINGERPRINT = ('framesize', 'quality', 'brightness', 'contrast', 'awb', 'aec')
+
+
+def local_networks(fallback='192.168.0.0/24'):
+    """IPv4 networks of every local interface, as CIDR strings
+
+    Uses psutil for real netmasks when it is installed; otherwise assumes a /24
+    around the address of the default route.
+    """
+    networks = []
+    try:
+        import psutil
+        for addresses in psutil.net_if_addrs().values():
+            for address in addresses:
+                if address.family != socket.AF_INET or not address.netmask:
+                    continue
+                network = ipaddress.ip_network(f'{address.address}/{address.netmask}', strict=False)
+                if not network.is_loopback and not network.is_link_local and network.num_addresses > 2:
+                    networks.append(str(network))
+    except ImportError:
+        pass
+
+    if not networks:
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+                s.connect(('8.8.8.8', 80))  # no packets sent; picks the default-route interface
+                networks.append(str(ipaddress.ip_network(f'{s.getsockname()[0]}/24', strict=False)))
+        except OSError:
+            networks.append(fallback)
+    return list(dict.fromkeys(networks))
+
+
+def iter_hosts(networks):
+    """Host addresses of each network, without duplicates across overlapping networks"""
+    seen = set()
+    for network in networks:
+        network = ipaddress.ip_network(network, strict=False)
+        hosts = network.hosts() if network.num_addresses > 2 else iter(network)
+        for host in hosts:
+            if host not in seen:
+                seen.add(host)
+                yield str(host)
+
+
+def is_camera_status(status):
+    """True if a parsed /status payload looks like CameraWebServer's sensor status"""
+    return isinstance(status, dict) and all(key in status for key in STATUS_FINGERPRINT)
+
+
+def camera_address(host, port):
+    """host, or host:port when the camera is not on the default HTTP port"""
+    return host if port == 80 else f'{host}:{port}'
+
+
+async def probe(host, port=80, timeout=DEFAULT_TIMEOUT):
+    """Fetch /status from host:port; returns a camera dict if it is an ESP32-CAM, else None"""
+    started = time.perf_counter()
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        writer.write(f'GET /status HTTP/1.0\r\nHost: {host}\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+        response = b''
+        # Read until the advertised body is complete; the ESP-IDF server may keep the socket open
+        while len(response) < MAX_STATUS_BYTES and not _response_complete(response):
+            chunk = await asyncio.wait_for(reader.read(MAX_STATUS_BYTES - len(response)), timeout)
+            if not chunk:
+                break
+            response += chunk
+    except (OSError, asyncio.TimeoutError):
+        return None
+    finally:
+        if writer is not None:
+            writer.close()
+
+    head, _, body = response.partition(b'\r\n\r\n')
+    status_line = head.split(b'\r\n', 1)[0].split()
+    if len(status_line) < 2 or status_line[1] != b'200':
+        return None
+    try:
+        status = json.loads(body)
+    except ValueError:
+        return None
+    if not is_camera_status(status):
+        return None
+    return {
+        'host': host,
+        'port': port,
+        'address': camera_address(host, port),
+        'status': status,
+        'latency_ms': round((time.perf_counter() - started) * 1000.0, 1),
+    }
+
+
+async def discover(networks=None, ports=DEFAULT_PORTS, hints=(), first=True,
+                   timeout=DEFAULT_TIMEOUT, concurrency=DEFAULT_CONCURRENCY):
+    """Find ESP32-CAMs on the given networks
+
+    networks:    CIDR strings (default: every local interface)
+    ports:       ports to probe on each host
+    hints:       addresses ('ip' or 'ip:port') probed before the sweep, e.g. known cameras
+    first:       stop at the first confirmed camera
+    timeout:     seconds per connection attempt and read
+    concurrency: probes in flight at once
+    Returns a list of camera dicts in the order they were confirmed.
+    """
+    networks = networks or local_networks()
+    concurrency = max(1, min(concurrency, _socket_budget()))
+
+    targets = _targets(networks, ports, hints)
+    found = []
+    done = asyncio.Event()
+
+    async def worker():
+        for host, port in targets:
+            if done.is_set():
+                return
+            camera = await probe(host, port, timeout)
+            if camera is not None and not done.is_set():
+                found.append(camera)
+                if first:
+                    done.set()
+
+    # A fixed pool of workers pulling from one generator keeps memory flat on large networks
+    workers = asyncio.gather(*(worker() for _ in range(concurrency)))
+    confirmed = asyncio.ensure_future(done.wait())
+    await asyncio.wait([workers, confirmed], return_when=asyncio.FIRST_COMPLETED)
+    workers.cancel()
+    confirmed.cancel()
+    await asyncio.gather(workers, confirmed, return_exceptions=True)
+    return found
+
+
+def find_cameras(networks=None, ports=DEFAULT_PORTS, hints=(), first=True,
+                 timeout=DEFAULT_TIMEOUT, concurrency=DEFAULT_CONCURRENCY):
+    """Blocking wrapper around discover() for scripts"""
+    return asyncio.run(discover(networks, ports, hints, first, timeout, concurrency))
+
+
+def probe_address(address, timeout=DEFAULT_TIMEOUT):
+    """Blocking /status probe of one 'ip' or 'ip:port' address"""
+    host, port = split_address(address)
+    return asyncio.run(probe(host, port, timeout))
+
+
+def _response_complete(response):
+    """True once the headers and a Content-Length worth of body have arrived"""
+    head, separator, body = response.partition(b'\r\n\r\n')
+    if not separator:
+        return False
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length' and value.strip().isdigit():
+            return len(body) >= int(value.strip())
+    return False
+
+
+def split_address(address, default_port=80):
+    """(host, port) from an 'ip' or 'ip:port' address"""
+    host, _, port = address.partition(':')
+    return host, int(port) if port else default_port
+
+
+def _targets(networks, ports, hints):
+    """(host, port) pairs: hints first, then every host of every network"""
+    seen = set()
+    for address in hints:
+        target = split_address(address)
+        seen.add(target)
+        yield target
+    for host in iter_hosts(networks):
+        for port in ports:
+            if (host, port) not in seen:
+                yield host, port
+
+
+def _socket_budget():
+    """How many sockets may be open at once under the process's file descriptor limit"""
+    try:
+        import resource
+    except ImportError:
+        return DEFAULT_CONCURRENCY  # Windows: the proactor loop has no select() limit
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < DEFAULT_CONCURRENCY + 64 <= hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (DEFAULT_CONCURRENCY + 64, hard))
+            soft = DEFAULT_CONCURRENCY + 64
+        except (ValueError, OSError):
+            pass
+    return DEFAULT_CONCURRENCY if soft == resource.RLIM_INFINITY else max(1, soft - 64)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Find ESP32-CAM devices on the network')
+    parser.add_argument('--network', action='append', help='CIDR to scan (repeatable; default: local interfaces)')
+    parser.add_argument('--port', type=int, action='append', help='port to probe (repeatable; default: 80)')
+    parser.add_argument('--all', action='store_true', help='find every camera instead of stopping at the first')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='seconds per probe')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='probes in flight')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    networks = args.network or local_networks()
+    ports = tuple(args.port or DEFAULT_PORTS)
+    hosts = sum(max(1, ipaddress.ip_network(n, strict=False).num_addresses - 2) for n in networks)
+    if not args.json:
+        print(f"🔍 Scanning {', '.join(networks)} ({hosts} hosts, ports {', '.join(map(str, ports))})...")
+
+    started = time.perf_counter()
+    cameras = find_cameras(networks, ports, first=not args.all, timeout=args.timeout,
+                           concurrency=args.concurrency)
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps({'elapsed_s': round(elapsed, 2), 'cameras': cameras}, indent=2))
+        return
+    for camera in cameras:
+        print(f"✅ ESP32-CAM at {camera['address']} (framesize {camera['status']['framesize']}, "
+              f"{camera['latency_ms']} ms)")
+    if not cameras:
+        print("❌ No ESP32-CAM found")
+    print(f"Scan took {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
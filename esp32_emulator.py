@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+ESP32-CAM Emulator
+Serves /capture, /stream (MJPEG), /status and /control the way
+CameraWebServer/app_httpd.cpp does, from a folder of JPEGs, a video file or
+synthetic frames, so the capture client, scanners and pipeline can be
+benchmarked without hardware. Network faults (latency, jitter, bandwidth caps
+and dropped connections) are set on the command line or changed while running
+through /faults, e.g. http://localhost:8080/faults?latency_ms=200&drop_rate=0.1
+
+Usage: python esp32_emulator.py [--frames ./frames | --video walk.mp4] [--port 8080]
+                                [--fps 15] [--latency-ms 0] [--jitter-ms 0]
+                                [--bandwidth-kbps 0] [--drop-rate 0] [--seed 1]
+
+Like the firmware, /stream is also served on port + 1 (81 on the device).
+"""
+
+import argparse
+import glob
+import io
+import json
+import math
+import os
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image, ImageDraw
+
+# Same multipart boundary and part header as app_httpd.cpp
+PART_BOUNDARY = '123456789000000000000987654321'
+STREAM_CONTENT_TYPE = f'multipart/x-mixed-replace;boundary={PART_BOUNDARY}'
+STREAM_BOUNDARY = f'\r\n--{PART_BOUNDARY}\r\n'.encode()
+STREAM_PART = 'Content-Type: image/jpeg\r\nContent-Length: {}\r\nX-Timestamp: {}\r\n\r\n'
+
+# framesize_t values from esp_camera, used to size synthetic frames
+FRAME_SIZES = {
+    0: (96, 96), 1: (160, 120), 2: (176, 144), 3: (240, 176), 4: (240, 240),
+    5: (320, 240), 6: (400, 296), 7: (480, 320), 8: (640, 480), 9: (800, 600),
+    10: (1024, 768), 11: (1280, 720), 12: (1280, 1024), 13: (1600, 1200),
+}
+
+# Sensor settings reported by /status, as an OV2640 reports them after boot
+DEFAULT_STATUS = {
+    'xclk': 20, 'pixformat': 4, 'framesize': 8, 'quality': 12, 'brightness': 0,
+    'contrast': 0, 'saturation': 0, 'sharpness': 0, 'special_effect': 0, 'wb_mode': 0,
+    'awb': 1, 'awb_gain': 1, 'aec': 1, 'aec2': 0, 'ae_level': 0, 'aec_value': 168,
+    'agc': 1, 'agc_gain': 0, 'gainceiling': 0, 'bpc': 0, 'wpc': 1, 'raw_gma': 1,
+    'lenc': 1, 'hmirror': 0, 'dcw': 1, 'colorbar': 0, 'led_intensity': -1,
+    'face_detect': 0, 'face_enroll': 0, 'face_recognize': 0,
+}
+# Variables /control accepts besides the ones /status reports
+CONTROL_ONLY = ('vflip',)
+
+SYNTHETIC_FRAMES = 30
+
+
+class FrameSource:
+    """JPEG frames played back in a loop at a fixed frame rate"""
+
+    def __init__(self, fps=15.0, frames=None, video=None, max_frames=300):
+        if not 0 < fps < float('inf'):
+            raise ValueError(f'fps must be a finite number greater than 0, got {fps}')
+        self.fps = fps
+        self.started = time.monotonic()
+        self._synthetic = {}  # (framesize, quality) -> list of JPEG bytes
+        self._lock = threading.Lock()
+        if frames:
+            self.frames = self._load_folder(frames)
+        elif video:
+            self.frames = self._load_video(video, max_frames)
+        else:
+            self.frames = None
+        if self.frames is not None and not self.frames:
+            raise ValueError(f'No frames found in {frames or video}')
+
+    @staticmethod
+    def _load_folder(folder):
+        paths = sorted(p for pattern in ('*.jpg', '*.jpeg') for p in glob.glob(os.path.join(folder, pattern)))
+        frames = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                frames.append(f.read())
+        return frames
+
+    @staticmethod
+    def _load_video(path, max_frames):
+        import cv2  # only needed for video sources
+        capture = cv2.VideoCapture(path)
+        frames = []
+        while len(frames) < max_frames:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+            if ok:
+                frames.append(encoded.tobytes())
+        capture.release()
+        return frames
+
+    def _render_synthetic(self, framesize, quality):
+        """Moving-bar test pattern at the sensor's frame size and JPEG quality"""
+        width, height = FRAME_SIZES.get(framesize, FRAME_SIZES[8])
+        # Sensor quality runs 0 (best) to 63 (worst)
+        jpeg_quality = max(5, min(95, 100 - int(quality) * 95 // 63))
+        frames = []
+        for index in range(SYNTHETIC_FRAMES):
+            image = Image.new('RGB', (width, height), (40, 60, 90))
+            draw = ImageDraw.Draw(image)
+            x = index * width // SYNTHETIC_FRAMES
+            draw.rectangle([x, 0, x + width // 8, height], fill=(220, 200, 60))
+            draw.text((8, 8), f'ESP32-CAM emulator frame {index}', fill=(255, 255, 255))
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=jpeg_quality)
+            frames.append(buffer.getvalue())
+        return frames
+
+    def current(self, status):
+        """The frame the camera would be showing now"""
+        if self.frames is not None:
+            frames = self.frames
+        else:
+            key = (status['framesize'], status['quality'])
+            with self._lock:
+                frames = self._synthetic.get(key)
+                if frames is None:
+                    frames = self._synthetic[key] = self._render_synthetic(*key)
+        return frames[int((time.monotonic() - self.started) * self.fps) % len(frames)]
+
+
+class NetworkConditions:
+    """Injected latency, jitter, bandwidth cap and connection drops, changeable at runtime"""
+
+    FIELDS = {'latency_ms': float, 'jitter_ms': float, 'bandwidth_kbps': float, 'drop_rate': float}
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, bandwidth_kbps=0.0, drop_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.bandwidth_kbps = bandwidth_kbps  # 0: unlimited
+        self.drop_rate = drop_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def update(self, values):
+        """Apply new settings from query or JSON values; raises ValueError on bad input"""
+        updates = {}
+        for name, value in values.items():
+            if name not in self.FIELDS:
+                raise ValueError(f'unknown setting {name}')
+            try:
+                updates[name] = self.check(name, self.FIELDS[name](value))
+            except ValueError as e:
+                raise ValueError(f'{name} {e}')
+        with self._lock:
+            for name, value in updates.items():
+                setattr(self, name, value)
+
+    @staticmethod
+    def check(name, value):
+        """Return value if it is in range for the named setting, else raise ValueError"""
+        if name == 'drop_rate' and not 0 <= value <= 1:
+            raise ValueError(f'must be between 0 and 1, got {value}')
+        if not (math.isfinite(value) and value >= 0):
+            raise ValueError(f'must be a finite number of at least 0, got {value}')
+        return value
+
+    def settings(self):
+        with self._lock:
+            return {name: getattr(self, name) for name in self.FIELDS}
+
+    def delay(self, latency=True):
+        """Sleep for the configured latency (optionally) plus uniform jitter"""
+        with self._lock:
+            base = self.latency_ms if latency else self.jitter_ms
+            seconds = (base + self._random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def should_drop(self):
+        with self._lock:
+            return self.drop_rate > 0 and self._random.random() < self.drop_rate
+
+
+class Emulator:
+    """Camera state shared by every connection"""
+
+    def __init__(self, source, conditions):
+        self.source = source
+        self.conditions = conditions
+        self.status = dict(DEFAULT_STATUS)
+        self.lock = threading.Lock()
+        self.counters = {'captures': 0, 'streams': 0, 'stream_frames': 0, 'dropped': 0, 'bytes_sent': 0}
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def set_control(self, variable, value):
+        """Apply a /control change; returns False for variables the firmware rejects"""
+        with self.lock:
+            if variable not in self.status and variable not in CONTROL_ONLY:
+                return False
+            if variable == 'face_enroll':
+                self.status[variable] = int(not self.status[variable])
+            elif variable == 'framesize' and value not in FRAME_SIZES:
+                return False
+            elif variable in self.status:
+                self.status[variable] = value
+            return True
+
+    def sensor_status(self):
+        with self.lock:
+            return dict(self.status)
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+
+class CameraHandler(BaseHTTPRequestHandler):
+    """Request handler mirroring the firmware's URI handlers"""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the ESP-IDF httpd
+    server_version = 'esp32-emulator'
+    emulator = None
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        routes = {
+            '/capture': self.handle_capture,
+            '/stream': self.handle_stream,
+            '/status': self.handle_status,
+            '/control': self.handle_control,
+            '/faults': self.handle_faults,
+        }
+        handler = routes.get(url.path)
+        if handler is None:
+            self.send_empty(404)
+            return
+        if url.path != '/faults':
+            self.emulator.conditions.delay()
+        try:
+            handler(params)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/faults':
+            self.send_empty(405)
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            values = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self.send_json({'error': 'invalid JSON'}, 400)
+            return
+        self.handle_faults(values)
+
+    # Responses
+
+    def send_empty(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def write_throttled(self, data, drop=False):
+        """Write data under the bandwidth cap; with drop, cut the connection halfway through"""
+        if drop:
+            data = data[:len(data) // 2]
+        kbps = self.emulator.conditions.settings()['bandwidth_kbps']
+        chunk = 1460 if kbps else len(data)
+        started = time.monotonic()
+        for offset in range(0, len(data), max(chunk, 1)):
+            self.wfile.write(data[offset:offset + chunk])
+            if kbps:
+                sent = min(offset + chunk, len(data))
+                wait = started + sent * 8 / (kbps * 1000.0) - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+        self.emulator.count('bytes_sent', len(data))
+        if drop:
+            self.drop_connection()
+
+    def drop_connection(self):
+        """Reset the TCP connection the way a Wi-Fi dropout looks to the client"""
+        self.emulator.count('dropped')
+        self.close_connection = True
+        try:
+            self.wfile.flush()
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    @staticmethod
+    def timestamp():
+        now = time.time()
+        return f'{int(now)}.{int(now % 1 * 1e6):06d}'
+
+    # Endpoints
+
+    def handle_capture(self, params):
+        frame = self.emulator.source.current(self.emulator.sensor_status())
+        self.emulator.count('captures')
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Disposition', 'inline; filename=capture.jpg')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('X-Timestamp', self.timestamp())
+        self.send_header('Content-Length', str(len(frame)))
+        self.end_headers()
+        self.write_throttled(frame, drop=self.emulator.conditions.should_drop())
+
+    def handle_stream(self, params):
+        """MJPEG stream until the client goes away or a drop is injected"""
+        self.emulator.count('streams')
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header('Content-Type', STREAM_CONTENT_TYPE)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('X-Framerate', str(int(self.emulator.source.fps)))
+        self.end_headers()
+
+        interval = 1.0 / self.emulator.source.fps
+        next_frame = time.monotonic()
+        while True:
+            frame = self.emulator.source.current(self.emulator.sensor_status())
+            part = STREAM_BOUNDARY + STREAM_PART.format(len(frame), self.timestamp()).encode() + frame
+            drop = self.emulator.conditions.should_drop()
+            self.write_throttled(part, drop=drop)
+            if drop:
+                return
+            self.wfile.flush()
+            self.emulator.count('stream_frames')
+
+            next_frame += interval
+            wait = next_frame - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            else:
+                next_frame = time.monotonic()  # bandwidth-bound: do not try to catch up
+            # Latency delays the whole stream once; jitter varies every frame
+            self.emulator.conditions.delay(latency=False)
+
+    def handle_status(self, params):
+        self.send_json(self.emulator.sensor_status())
+
+    def handle_control(self, params):
+        if 'var' not in params or 'val' not in params:
+            self.send_empty(404)
+            return
+        try:
+            value = int(params['val'])
+        except ValueError:
+            value = 0  # the firmware uses atoi()
+        if not self.emulator.set_control(params['var'], value):
+            self.send_empty(500)
+            return
+        self.send_empty(200)
+
+    def handle_faults(self, values):
+        """Current fault settings and counters; any given values change the settings"""
+        try:
+            self.emulator.conditions.update(values)
+        except (TypeError, ValueError) as e:
+            self.send_json({'error': str(e)}, 400)
+            return
+        self.send_json({'conditions': self.emulator.conditions.settings(), 'stats': self.emulator.stats()})
+
+
+def start_server(emulator, host, port, verbose=False):
+    """Serve the camera endpoints on a background thread; returns the server"""
+    handler = type('BoundCameraHandler', (CameraHandler,), {'emulator': emulator})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    threading.Thread(target=server.serve_forever, name=f'emulator-{port}', daemon=True).start()
+    return server
+
+
+def positive_float(value):
+    """argparse type for a finite float greater than zero"""
+    number = float(value)
+    if not 0 < number < float('inf'):
+        raise argparse.ArgumentTypeError(f'must be a finite number greater than 0, got {value}')
+    return number
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Emulate an ESP32-CAM running CameraWebServer')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--frames', help='folder of JPEG frames to play in a loop')
+    source.add_argument('--video', help='video file to play in a loop (needs opencv-python)')
+    parser.add_argument('--max-frames', type=int, default=300, help='frames kept from a video')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080, help='camera port (80 on the device)')
+    parser.add_argument('--stream-port', type=int, default=None, help='second /stream port (default: port + 1)')
+    parser.add_argument('--fps', type=positive_float, default=15.0, help='playback and stream frame rate')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='added delay before each response')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='uniform +/- variation of that delay')
+    parser.add_argument('--bandwidth-kbps', type=float, default=0.0, help='per-connection cap (0: unlimited)')
+    parser.add_argument('--drop-rate', type=float, default=0.0,
+                        help='probability a response (or stream frame) is cut off mid-transfer')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for repeatable faults')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+    for name in NetworkConditions.FIELDS:
+        try:
+            NetworkConditions.check(name, getattr(args, name))
+        except ValueError as e:
+            parser.error(f"--{name.replace('_', '-')} {e}")
+
+    try:
+        frame_source = FrameSource(args.fps, frames=args.frames, video=args.video, max_frames=args.max_frames)
+    except (ValueError, ImportError) as e:
+        print(f"❌ {e}")
+        return
+    conditions = NetworkConditions(args.latency_ms, args.jitter_ms, args.bandwidth_kbps, args.drop_rate, args.seed)
+    emulator = Emulator(frame_source, conditions)
+
+    stream_port = args.stream_port or args.port + 1
+    servers = [start_server(emulator, args.host, port, args.verbose) for port in (args.port, stream_port)]
+
+    source_desc = args.frames or args.video or 'synthetic test pattern'
+    frames_desc = f"{len(frame_source.frames)} frames" if frame_source.frames else 'frames sized by /control'
+    print("📷 ESP32-CAM Emulator")
+    print("=" * 40)
+    print(f"Source: {source_desc} ({frames_desc}) at {args.fps} fps")
+    print(f"Capture URL: http://localhost:{args.port}/capture")
+    print(f"Stream URL:  http://localhost:{stream_port}/stream")
+    print(f"Faults:      http://localhost:{args.port}/faults  {json.dumps(conditions.settings())}")
+    print("Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\n👋 Stopping emulator")
+    finally:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -4,96 +4,38 @@ ESP32-CAM IP Discovery Script for MCA-WR-2 Network
 This script helps find the IP address of your ESP32-CAM when connected to MCA-WR-2 WiFi
 """
 
-import socket
-import threading
 import time
+
 import requests
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def scan_port(ip, port, timeout=1):
-    """Scan a specific port on an IP address"""
-    try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        result = sock.connect_ex((ip, 80))
-        sock.close()
-        return result == 0
-    except:
-        return False
+from esp32_discovery import find_cameras, local_networks, probe_address
 
 def test_esp32_camera(ip):
-    """Test if an IP is running ESP32 camera service"""
-    try:
-        # Test capture endpoint
-        response = requests.get(f'http://{ip}/capture', timeout=3)
-        if response.status_code == 200 and 'image' in response.headers.get('content-type', ''):
-            return True
-    except:
-        pass
-    return False
+    """Test if an IP is running ESP32 camera service (checks the /status sensor JSON)"""
+    return probe_address(ip, timeout=3) is not None
 
 def get_local_network():
-    """Get the local network range"""
-    try:
-        # Get local IP
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        local_ip = s.getsockname()[0]
-        s.close()
-        
-        # Extract network prefix (assuming /24)
-        network_parts = local_ip.split('.')
-        network_prefix = '.'.join(network_parts[:3])
-        return f"{network_prefix}.0/24"
-    except:
-        return "192.168.0.0/24"  # Fallback
+    """Get the local network ranges (every interface)"""
+    return local_networks()
 
-def scan_network():
+def scan_network(networks=None, first_only=True):
     """Scan the local network for ESP32 cameras"""
     print("🔍 Scanning MCA-WR-2 network for ESP32-CAM...")
     print("=" * 50)
     
-    # Get network range
-    network = get_local_network()
-    network_prefix = network.split('.')[0:3]
-    base_ip = '.'.join(network_prefix)
-    
-    print(f"Scanning network: {base_ip}.1-254")
-    print("This may take a few minutes...")
+    networks = networks or get_local_network()
+    print(f"Scanning network: {', '.join(networks)}")
     print()
     
-    found_ips = []
-    
-    # Scan all IPs in the range
-    with ThreadPoolExecutor(max_workers=50) as executor:
-        futures = []
-        
-        for i in range(1, 255):
-            ip = f"{base_ip}.{i}"
-            future = executor.submit(scan_port, ip, 80, 1)
-            futures.append((future, ip))
-        
-        # Check results
-        for future, ip in futures:
-            if future.result():
-                print(f"✅ Found device at {ip} (port 80 open)")
-                found_ips.append(ip)
+    # Every host is probed concurrently; cameras are recognised from /status, not a full capture
+    started = time.perf_counter()
+    cameras = find_cameras(networks, first=first_only)
     
-    print(f"\n📊 Found {len(found_ips)} devices with port 80 open")
-    
-    # Test each found IP for ESP32 camera
-    esp32_cameras = []
-    print("\n🤖 Testing for ESP32-CAM services...")
-    
-    for ip in found_ips:
-        print(f"Testing {ip}...", end=" ")
-        if test_esp32_camera(ip):
-            print("✅ ESP32-CAM found!")
-            esp32_cameras.append(ip)
-        else:
-            print("❌ Not ESP32-CAM")
+    for camera in cameras:
+        print(f"✅ ESP32-CAM found at {camera['address']}")
+    print(f"\n📊 Scan finished in {time.perf_counter() - started:.1f}s")
     
-    return esp32_cameras
+    return [camera['address'] for camera in cameras]
 
 def test_esp32_connection(ip):
     """Test connection to ESP32 camera"""
@@ -110,7 +52,8 @@ def test_esp32_connection(ip):
             
             # Test stream endpoint
             try:
-                stream_response = requests.get(f'http://{ip}/stream', timeout=3)
+                stream_response = requests.get(f'http://{ip}/stream', timeout=3, stream=True)
+                stream_response.close()
                 if stream_response.status_code == 200:
                     print(f"✅ Stream endpoint working")
                 else:
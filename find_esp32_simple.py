@@ -3,48 +3,18 @@
 Simple ESP32 IP Finder for MCA-WR-2 Network
 """
 
-import requests
-import socket
-import threading
-from concurrent.futures import ThreadPoolExecutor
-
-def test_ip(ip):
-    """Test if an IP has ESP32 camera"""
-    try:
-        response = requests.get(f'http://{ip}/capture', timeout=2)
-        if response.status_code == 200 and 'image' in response.headers.get('content-type', ''):
-            return ip
-    except:
-        pass
-    return None
+from discovery_cache import find_cameras_cached
+from esp32_discovery import local_networks
 
 def find_esp32():
     """Find ESP32 on MCA-WR-2 network"""
     print("🔍 Searching for ESP32-CAM on MCA-WR-2 network...")
     
-    # Get local network
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        local_ip = s.getsockname()[0]
-        s.close()
-        network = '.'.join(local_ip.split('.')[:3])
-    except:
-        network = '192.168.0'  # Fallback
-    
-    print(f"Scanning network: {network}.1-254")
+    # Cached addresses first; otherwise every local interface, stopping at the first camera
+    networks = local_networks()
+    print(f"Scanning network (if the cached camera has moved): {', '.join(networks)}")
     
-    found_ips = []
-    with ThreadPoolExecutor(max_workers=50) as executor:
-        futures = []
-        for i in range(1, 255):
-            ip = f"{network}.{i}"
-            futures.append(executor.submit(test_ip, ip))
-        
-        for future in futures:
-            result = future.result()
-            if result:
-                found_ips.append(result)
+    found_ips = [camera['address'] for camera in find_cameras_cached(networks)]
     
     if found_ips:
         print(f"\n✅ Found ESP32-CAM at: {found_ips[0]}")
@@ -10,7 +10,8 @@ import os
 import time
 import requests
 import threading
-from find_esp32_ip import scan_network, test_esp32_connection
+from discovery_cache import find_cameras_cached
+from find_esp32_ip import test_esp32_connection
 
 def check_python_packages():
     """Check if required Python packages are installed"""
@@ -38,6 +39,38 @@ def check_python_packages():
     print("✅ All required Python packages are installed")
     return True
 
+def wait_for_service_ready(base_url, process=None, timeout=300, initial_delay=0.5, max_delay=5.0):
+    """Poll the /ready endpoint with exponential backoff until the model is ready"""
+    deadline = time.time() + timeout
+    delay = initial_delay
+    
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            print(f"❌ VIT-GPT service exited with code {process.returncode}")
+            return False
+        
+        try:
+            response = requests.get(f'{base_url}/ready', timeout=2)
+            status = response.json()
+            if response.status_code == 200:
+                print(f"   Model loaded in {status.get('load_time_s')}s, "
+                      f"warmed up in {status.get('warmup_time_s')}s")
+                return True
+            if status.get('status') == 'failed':
+                print(f"❌ Model failed to load: {status.get('error')}")
+                return False
+            print(f"   Waiting for VIT-GPT service ({status.get('status', 'starting')})...")
+        except requests.exceptions.RequestException:
+            print("   Waiting for VIT-GPT service to bind...")
+        except ValueError:
+            pass
+        
+        time.sleep(min(delay, max(0, deadline - time.time())))
+        delay = min(delay * 2, max_delay)
+    
+    print(f"❌ VIT-GPT service not ready after {timeout}s")
+    return False
+
 def start_vitgpt_service():
     """Start VIT-GPT service in background"""
     print("🚀 Starting VIT-GPT AI Service...")
@@ -49,28 +82,24 @@ def start_vitgpt_service():
             print("❌ VIT-GPT directory not found")
             return None
         
-        # Start the service
+        # Start the service, logging to a file so a full pipe never stalls it
+        log_path = os.path.join(vitgpt_dir, 'server.log')
+        log_file = open(log_path, 'w')
         process = subprocess.Popen(
             [sys.executable, 'server.py'],
             cwd=vitgpt_dir,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+            stdout=log_file,
+            stderr=subprocess.STDOUT
         )
+        print(f"   Service log: {log_path}")
         
-        # Wait a bit for service to start
-        time.sleep(5)
-        
-        # Test if service is running
-        try:
-            response = requests.get('http://localhost:5000/health', timeout=5)
-            if response.status_code == 200:
-                print("✅ VIT-GPT service started successfully")
-                return process
-            else:
-                print("❌ VIT-GPT service failed to start properly")
-                return None
-        except:
-            print("❌ VIT-GPT service not responding")
+        # Poll readiness until the model is loaded and warmed up
+        if wait_for_service_ready('http://localhost:5000', process):
+            print("✅ VIT-GPT service started successfully")
+            return process
+        else:
+            print("❌ VIT-GPT service failed to start properly")
+            process.terminate()
             return None
             
     except Exception as e:
@@ -81,7 +110,8 @@ def find_esp32_camera():
     """Find ESP32 camera on MCA-WR-2 network"""
     print("🔍 Searching for ESP32-CAM on MCA-WR-2 network...")
     
-    esp32_cameras = scan_network()
+    # Last-known addresses are revalidated first; the network is only scanned if they all miss
+    esp32_cameras = [camera['address'] for camera in find_cameras_cached()]
     
     if not esp32_cameras:
         print("❌ No ESP32-CAM devices found")
@@ -0,0 +1,300 @@
+"""
+Admission control for inference requests
+Bounds how many requests may wait for the model, drops requests whose
+client-supplied deadline has passed before they reach it, and keeps only the
+newest waiting frame per client so nobody is told about a scene they have
+already walked past. Waiting requests are kept in priority lanes (navigation
+ahead of scene description), with aging so lower lanes are never starved.
+Threaded servers wait in acquire(); asyncio servers wait in acquire_async(),
+which queues in the same lanes without holding a thread.
+"""
+
+import asyncio
+import collections
+import threading
+import time
+
+from pipeline import StageTimer
+
+
+class AdmissionRejected(Exception):
+    """Base class for requests turned away before inference"""
+    status_code = 503
+    retry_after = 1
+
+
+class QueueFull(AdmissionRejected):
+    """Every inference slot is busy and the wait queue is full"""
+    status_code = 503
+
+
+class Superseded(AdmissionRejected):
+    """A newer frame from the same client replaced this waiting request"""
+    status_code = 429
+    retry_after = 0
+
+
+class DeadlineExceeded(AdmissionRejected):
+    """The request's deadline passed before inference started"""
+    status_code = 504
+    retry_after = 0
+
+
+def deadline_from_header(value, now=None):
+    """Monotonic deadline from a remaining-milliseconds header value, or None"""
+    if value in (None, ''):
+        return None
+    remaining_ms = float(value)
+    if remaining_ms < 0:
+        raise ValueError('deadline must not be negative')
+    return (now if now is not None else time.monotonic()) + remaining_ms / 1000.0
+
+
+class _Ticket:
+    __slots__ = ('client_id', 'deadline', 'lane', 'enqueued_at', 'state', 'wake')
+
+    def __init__(self, client_id, deadline, lane, wake=None):
+        self.client_id = client_id
+        self.deadline = deadline
+        self.lane = lane
+        self.enqueued_at = time.monotonic()
+        self.state = 'waiting'  # waiting -> admitted | superseded | expired | cancelled
+        self.wake = wake  # called when the state changes, for waiters not on the condition
+
+    def settle(self, state):
+        self.state = state
+        if self.wake is not None:
+            self.wake()
+
+
+class AdmissionController:
+    """Inference slots plus bounded priority lanes of waiting requests, newest frame per client"""
+
+    def __init__(self, max_active=8, max_waiting=16, retry_after=1, lanes=('default',),
+                 starvation_ms=None):
+        """
+        max_active:    requests allowed past admission (and into the batcher) at once
+        max_waiting:   requests allowed to wait for a slot across all lanes; more are
+                       rejected (0 disables waiting)
+        retry_after:   seconds suggested to rejected clients when the queue is full
+        lanes:         lane names, highest priority first
+        starvation_ms: a request waiting this long may be served ahead of higher lanes,
+                       at most every other grant so priority still holds under
+                       sustained overload (None: strict priority)
+        """
+        self.max_active = max(1, int(max_active))
+        self.max_waiting = max(0, int(max_waiting))
+        self.retry_after = retry_after
+        self.lanes = tuple(lanes)
+        self.starvation = starvation_ms / 1000.0 if starvation_ms else None
+
+        self._condition = threading.Condition()
+        self._waiting = {lane: collections.deque() for lane in self.lanes}
+        self._waiting_by_client = {}
+        self._active = 0
+
+        self.admitted = 0
+        self.rejected_full = 0
+        self.superseded = 0
+        self.expired = 0
+        self.starvation_grants = 0
+        self._last_grant_starved = False
+        self._lane_admitted = {lane: 0 for lane in self.lanes}
+        self._wait_timers = {lane: StageTimer() for lane in self.lanes}
+        self._latency_timers = {lane: StageTimer() for lane in self.lanes}
+
+    def acquire(self, client_id=None, deadline=None, lane=None):
+        """Wait for an inference slot; raises an AdmissionRejected subclass instead"""
+        with self._condition:
+            ticket = self._enqueue(client_id, deadline, lane)
+            if ticket is None:
+                return
+            while ticket.state == 'waiting':
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    self._forget(ticket)
+                    ticket.state = 'expired'
+                    break
+                self._condition.wait(timeout)
+            self._raise_unless_admitted(ticket)
+
+    async def acquire_async(self, client_id=None, deadline=None, lane=None):
+        """acquire() for asyncio callers: waits on the event loop instead of blocking a thread
+
+        If the caller is cancelled while waiting, its place in the queue (or the
+        slot it was just granted) is given up.
+        """
+        loop = asyncio.get_running_loop()
+        woken = asyncio.Event()
+        with self._condition:
+            ticket = self._enqueue(client_id, deadline, lane,
+                                   wake=lambda: loop.call_soon_threadsafe(woken.set))
+            if ticket is None:
+                return
+        try:
+            while ticket.state == 'waiting':
+                timeout = None if deadline is None else deadline - time.monotonic()
+                try:
+                    await asyncio.wait_for(woken.wait(), timeout)
+                except asyncio.TimeoutError:
+                    with self._condition:
+                        if ticket.state == 'waiting':
+                            self._forget(ticket)
+                            ticket.state = 'expired'
+                woken.clear()
+        except BaseException:
+            with self._condition:
+                admitted = ticket.state == 'admitted'
+                if ticket.state == 'waiting':
+                    self._forget(ticket)
+                    ticket.state = 'cancelled'
+            if admitted:
+                self.release()
+            raise
+        with self._condition:
+            self._raise_unless_admitted(ticket)
+
+    def release(self, lane=None, started=None):
+        """Free a slot and hand it to the next waiting request that can still use it
+
+        lane and started (time.monotonic() when acquire was called) record the
+        request's end-to-end latency for its lane.
+        """
+        with self._condition:
+            self._active -= 1
+            if lane in self._latency_timers and started is not None:
+                self._latency_timers[lane].record(time.monotonic() - started)
+
+            now = time.monotonic()
+            while self._active < self.max_active:
+                ticket = self._next_ticket(now)
+                if ticket is None:
+                    break
+                self._forget(ticket)
+                if ticket.deadline is not None and ticket.deadline <= now:
+                    ticket.settle('expired')
+                    continue
+                ticket.settle('admitted')
+                self._active += 1
+                self._count_admission(ticket.lane, now - ticket.enqueued_at)
+            self._condition.notify_all()
+
+    def slot(self, client_id=None, deadline=None, lane=None):
+        """Context manager holding an inference slot"""
+        return _Slot(self, client_id, deadline, lane)
+
+    def stats(self):
+        """Queue depth, rejection counters and per-lane wait and latency metrics"""
+        with self._condition:
+            return {
+                'active': self._active,
+                'waiting': self._waiting_count(),
+                'max_active': self.max_active,
+                'max_waiting': self.max_waiting,
+                'admitted': self.admitted,
+                'rejected_full': self.rejected_full,
+                'superseded': self.superseded,
+                'expired': self.expired,
+                'starvation_grants': self.starvation_grants,
+                'lanes': {
+                    lane: {
+                        'waiting': len(self._waiting[lane]),
+                        'admitted': self._lane_admitted[lane],
+                        'queue_wait': self._wait_timers[lane].summary(),
+                        'latency': self._latency_timers[lane].summary(),
+                    }
+                    for lane in self.lanes
+                },
+            }
+
+    def _next_ticket(self, now):
+        """Oldest starved lower-lane request if one may go now, else the head of the highest lane"""
+        lane = self._first_waiting_lane()
+        if lane is None:
+            return None
+        if self.starvation is not None and not self._last_grant_starved:
+            starved = [queue[0] for name, queue in self._waiting.items()
+                       if name != lane and queue and now - queue[0].enqueued_at >= self.starvation]
+            if starved:
+                self.starvation_grants += 1
+                self._last_grant_starved = True
+                return min(starved, key=lambda t: t.enqueued_at)
+        self._last_grant_starved = False
+        return self._waiting[lane][0]
+
+    def _first_waiting_lane(self):
+        return next((lane for lane in self.lanes if self._waiting[lane]), None)
+
+    def _waiting_count(self):
+        return sum(len(queue) for queue in self._waiting.values())
+
+    def _count_admission(self, lane, waited):
+        self.admitted += 1
+        self._lane_admitted[lane] += 1
+        self._wait_timers[lane].record(waited)
+
+    def _enqueue(self, client_id, deadline, lane, wake=None):
+        """Take a free slot (returns None) or queue a waiting ticket (caller holds the lock)"""
+        lane = lane if lane in self._waiting else self.lanes[-1]
+        self._check_deadline(deadline)
+        if self._active < self.max_active and not self._waiting_count():
+            self._active += 1
+            self._count_admission(lane, 0.0)
+            return None
+
+        previous = self._waiting_by_client.get(client_id) if client_id is not None else None
+        if previous is not None:
+            # Latest frame wins: the older request gives up its place in the queue
+            self._forget(previous)
+            previous.settle('superseded')
+            self.superseded += 1
+        elif self._waiting_count() >= self.max_waiting:
+            self.rejected_full += 1
+            error = QueueFull(f'Inference queue full ({self._waiting_count()} waiting)')
+            error.retry_after = self.retry_after
+            raise error
+
+        ticket = _Ticket(client_id, deadline, lane, wake)
+        self._waiting[lane].append(ticket)
+        if client_id is not None:
+            self._waiting_by_client[client_id] = ticket
+        self._condition.notify_all()
+        return ticket
+
+    def _raise_unless_admitted(self, ticket):
+        if ticket.state == 'superseded':
+            raise Superseded('Replaced by a newer frame from the same client')
+        if ticket.state == 'expired':
+            self.expired += 1
+            raise DeadlineExceeded('Deadline passed while waiting for inference')
+
+    def _check_deadline(self, deadline):
+        if deadline is not None and deadline <= time.monotonic():
+            self.expired += 1
+            raise DeadlineExceeded('Deadline passed before the request was admitted')
+
+    def _forget(self, ticket):
+        """Remove a ticket from the wait structures (caller holds the lock)"""
+        queue = self._waiting[ticket.lane]
+        if ticket in queue:
+            queue.remove(ticket)
+        if ticket.client_id is not None and self._waiting_by_client.get(ticket.client_id) is ticket:
+            del self._waiting_by_client[ticket.client_id]
+
+
+class _Slot:
+    def __init__(self, controller, client_id, deadline, lane):
+        self.controller = controller
+        self.client_id = client_id
+        self.deadline = deadline
+        self.lane = lane if lane in controller.lanes else controller.lanes[-1]
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        self.controller.acquire(self.client_id, self.deadline, self.lane)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.controller.release(self.lane, self.started)
+        return False
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Production ASGI serving mode for the VIT-GPT AI Service
+Serves the same /analyze_image, /speak, /health and /info contract as the
+Flask development server, but on uvicorn with model inference running on a
+dedicated executor so health checks and request parsing never wait behind it.
+Requests wait for admission on the event loop, in its priority lanes, and only
+admitted ones reach the executor, which has one thread per admission slot.
+It also offers /stream, a WebSocket that takes binary JPEG frames and pushes
+results back as they finish, always analysing the newest frame it has.
+
+Run with:  python asgi.py [--backend onnx]   or   uvicorn asgi:app --host 0.0.0.0 --port 5000
+(with uvicorn, choose the backend through VITGPT_BACKEND)
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+
+from starlette.applications import Starlette
+from starlette.datastructures import UploadFile
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+import server
+
+# Serving settings (override with environment variables)
+HOST = os.environ.get('VITGPT_HOST', '0.0.0.0')
+PORT = int(os.environ.get('VITGPT_PORT', '5000'))
+REQUEST_TIMEOUT = float(os.environ.get('VITGPT_REQUEST_TIMEOUT', '30'))
+# Admission bounds concurrent analyses, so an admitted request never waits for a thread
+INFERENCE_CONCURRENCY = server.admission.max_active
+
+# Inference threads feed the batch scheduler
+inference_executor = ThreadPoolExecutor(max_workers=INFERENCE_CONCURRENCY, thread_name_prefix='inference')
+# Analyses submitted to the executor that no thread has picked up yet
+_executor_backlog = 0
+_executor_backlog_lock = threading.Lock()
+
+
+def _count_backlog(delta):
+    global _executor_backlog
+    with _executor_backlog_lock:
+        _executor_backlog += delta
+
+
+def executor_backlog():
+    """Admitted analyses waiting for an inference thread"""
+    return _executor_backlog
+
+
+server.extra_queues['executor'] = executor_backlog
+
+
+async def run_in_executor(executor, timeout, fn, *args):
+    """Run a blocking call on an executor without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(loop.run_in_executor(executor, fn, *args), timeout)
+
+
+async def analyze(image_data, mode, decoding=None, client_id=None, deadline=None, use_cache=True):
+    """Analyse one frame: stored results and admission on the event loop, inference on the executor
+
+    Raises AdmissionRejected, ServiceNotReady or asyncio.TimeoutError like the
+    blocking server.analyze_image_data() it replaces.
+    """
+    modes, key, response_data = server.begin_analysis(image_data, mode, decoding, use_cache)
+    if response_data is not None:
+        return response_data
+
+    loop = asyncio.get_running_loop()
+    give_up_at = loop.time() + REQUEST_TIMEOUT
+    lane = server.request_lane(modes)
+    started = time.monotonic()
+    await asyncio.wait_for(server.admission.acquire_async(client_id, deadline, lane), REQUEST_TIMEOUT)
+    server.stage_seconds.observe(time.monotonic() - started, 'admission')
+
+    _count_backlog(1)
+    future = inference_executor.submit(run_admitted, image_data, modes, key, decoding, deadline, lane, started,
+                                       use_cache)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), max(0.0, give_up_at - loop.time()))
+    finally:
+        if future.cancelled():
+            # Never ran, so run_admitted neither left the backlog nor freed the slot
+            _count_backlog(-1)
+            server.admission.release(lane, started)
+
+
+def run_admitted(image_data, modes, key, decoding, deadline, lane, started, use_cache=True):
+    """Executor side of analyze(): caption an admitted frame, then free its slot"""
+    _count_backlog(-1)
+    try:
+        return server.run_analysis(image_data, modes, key, decoding, deadline, lane, use_cache)
+    finally:
+        server.admission.release(lane, started)
+
+
+async def health_check(request):
+    """Health check endpoint"""
+    return JSONResponse(server.health_status())
+
+
+async def ready_check(request):
+    """Readiness endpoint: 200 once the model is loaded and warmed up"""
+    payload, status = server.readiness_status()
+    return JSONResponse(payload, status_code=status)
+
+
+async def get_info(request):
+    """Get service information"""
+    info = server.service_info()
+    info['serving'] = {
+        'mode': 'asgi',
+        'inference_concurrency': INFERENCE_CONCURRENCY,
+        'request_timeout': REQUEST_TIMEOUT,
+    }
+    return JSONResponse(info)
+
+
+def analysis_response(request, payload, status_code=200, headers=None):
+    """Response for /analyze_image in the encoding the client asked for, recording its metrics"""
+    use_msgpack = server.wants_msgpack(request.headers.get('accept'), request.query_params)
+    with server.stage_seconds.time('encode'):
+        body, content_type = server.encode_payload(payload, use_msgpack)
+    server.record_request(getattr(request.state, 'analysis_mode', 'other'), status_code,
+                          time.perf_counter() - request.state.analysis_start, payload.get('reason'))
+    return Response(body, status_code=status_code, headers=headers, media_type=content_type)
+
+
+async def get_metrics(request):
+    """Prometheus metrics in the text exposition format"""
+    return Response(server.metrics_registry.render(), media_type=server.METRICS_CONTENT_TYPE)
+
+
+async def analyze_image(request):
+    """Analyze an uploaded image (multipart form or raw image body) and return description based on mode"""
+    request.state.analysis_start = time.perf_counter()
+    try:
+        # Taken before the body is read so the deadline covers upload time too
+        try:
+            client_id, deadline = server.request_admission(
+                request.headers, request.client.host if request.client else None)
+        except ValueError as e:
+            return analysis_response(request, {'error': f'Invalid X-Deadline-Ms: {str(e)}'}, 400)
+
+        upload_start = time.perf_counter()
+        content_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+        if content_type in server.RAW_IMAGE_TYPES:
+            # Raw body: no form parsing or spooling, mode and options come from the query string
+            params = request.query_params
+            image_data = await request.body()
+            if not image_data:
+                return analysis_response(request, {'error': 'No image data provided'}, 400)
+        else:
+            params = await request.form()
+            file = params.get('image')
+
+            if not isinstance(file, UploadFile):
+                return analysis_response(request, {'error': 'No image file provided'}, 400)
+            if file.filename == '':
+                return analysis_response(request, {'error': 'No image file selected'}, 400)
+            image_data = await file.read()
+        server.stage_seconds.observe(time.perf_counter() - upload_start, 'upload')
+
+        mode = server.request_mode(params, request.headers)
+        request.state.analysis_mode = server.metrics_mode(mode)
+        try:
+            decoding = server.parse_decoding_options(params)
+        except ValueError as e:
+            return analysis_response(request, {'error': f'Invalid decoding options: {str(e)}'}, 400)
+
+        response_data = await analyze(image_data, mode, decoding, client_id, deadline,
+                                      server.allows_cached(request.headers))
+        return analysis_response(request, response_data)
+
+    except server.AdmissionRejected as e:
+        return analysis_response(request, *server.rejection_response(e))
+    except server.ServiceNotReady as e:
+        return analysis_response(request, {'error': f'Service not ready: {str(e)}'}, 503, {'Retry-After': '5'})
+    except (asyncio.TimeoutError, FuturesTimeoutError):
+        print(f"Image analysis timed out after {REQUEST_TIMEOUT}s")
+        return analysis_response(request, {'error': 'Failed to analyze image: timed out'}, 504)
+    except Exception as e:
+        print(f"Error analyzing image: {e}")
+        traceback.print_exc()
+        return analysis_response(request, {'error': f'Failed to analyze image: {str(e)}'}, 500)
+
+
+async def speak_text(request):
+    """Queue text for speech and return a job id straight away, or return its audio"""
+    try:
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        text, priority, interrupt, return_audio = server.parse_speech_request(data)
+        if return_audio:
+            # Cache misses wait for the speech worker to render
+            audio, headers = await run_in_executor(None, REQUEST_TIMEOUT, server.speech_audio, text, priority)
+            return Response(audio, headers=headers)
+        return JSONResponse(server.queue_speech(text, priority, interrupt), status_code=202)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    except server.SpeechUnavailable as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+    except (TimeoutError, asyncio.TimeoutError) as e:
+        return JSONResponse({'error': str(e) or 'Rendering speech timed out'}, status_code=504)
+    except Exception as e:
+        print(f"TTS error: {e}")
+        return JSONResponse({'error': f'TTS failed: {str(e)}'}, status_code=500)
+
+
+async def speech_status(request):
+    """Status of a queued speech job"""
+    job = server.speech_worker.status(request.path_params['job_id'])
+    if job is None:
+        return JSONResponse({'error': 'Unknown speech job'}, status_code=404)
+    return JSONResponse(job)
+
+
+def parse_stream_settings(params, current=None):
+    """Mode and decoding settings for /stream from query params or a control message"""
+    settings = dict(current or {'mode': 'scene_description', 'decoding': None})
+    if params.get('mode'):
+        settings['mode'] = params['mode']
+    if any(params.get(name) for name in ('max_new_tokens', 'num_beams', 'decoding')):
+        settings['decoding'] = server.parse_decoding_options(params)
+    return settings
+
+
+async def stream_analysis(websocket: WebSocket):
+    """Analyze a stream of binary JPEG frames on one WebSocket
+
+    Binary messages are frames; text messages are JSON control updates such as
+    {"mode": "navigation"} or {"decoding": "greedy"}. While a frame is being
+    analysed only the newest frame received meanwhile is kept, and results
+    carry the frame number they belong to and how many frames were dropped.
+    """
+    await websocket.accept()
+    try:
+        settings = parse_stream_settings(websocket.query_params)
+    except ValueError as e:
+        await websocket.send_json({'error': f'Invalid decoding options: {str(e)}'})
+        await websocket.close(code=1003)
+        return
+
+    latest = {'frame': None, 'sequence': 0}
+    client_id = f'stream-{id(websocket)}'
+    counters = {'received': 0, 'dropped': 0, 'analyzed': 0}
+    frame_ready = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    async def analyze_frames():
+        while True:
+            await frame_ready.wait()
+            frame_ready.clear()
+            image_data, sequence = latest['frame'], latest['sequence']
+            latest['frame'] = None
+            if image_data is None:
+                continue
+
+            start = loop.time()
+            try:
+                payload = await analyze(image_data, settings['mode'], settings['decoding'], client_id)
+                counters['analyzed'] += 1
+            except server.AdmissionRejected as e:
+                payload, _, _ = server.rejection_response(e)
+                payload['retry_after'] = e.retry_after
+            except server.ServiceNotReady as e:
+                payload = {'error': f'Service not ready: {str(e)}', 'retry_after': 5}
+            except asyncio.TimeoutError:
+                payload = {'error': 'Failed to analyze image: timed out'}
+            except Exception as e:
+                print(f"Error analyzing streamed frame: {e}")
+                payload = {'error': f'Failed to analyze image: {str(e)}'}
+
+            payload.update({
+                'frame': sequence,
+                'latency_ms': round((loop.time() - start) * 1000.0, 1),
+                'received': counters['received'],
+                'dropped': counters['dropped'],
+            })
+            await websocket.send_json(payload)
+
+    analyzer = asyncio.create_task(analyze_frames())
+    try:
+        while True:
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+            if message.get('bytes'):
+                counters['received'] += 1
+                if latest['frame'] is not None:
+                    counters['dropped'] += 1  # latest frame wins
+                latest['frame'] = message['bytes']
+                latest['sequence'] = counters['received']
+                frame_ready.set()
+            elif message.get('text'):
+                try:
+                    settings = parse_stream_settings(json.loads(message['text']), settings)
+                    await websocket.send_json({'settings': settings})
+                except (ValueError, AttributeError) as e:
+                    await websocket.send_json({'error': f'Invalid control message: {str(e)}'})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        analyzer.cancel()
+        print(f"Stream closed: {counters['received']} frames received, "
+              f"{counters['analyzed']} analyzed, {counters['dropped']} dropped")
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    """Bind first, then load and warm up the model in the background (a no-op if the import already did)"""
+    server.start_services()
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route('/health', health_check, methods=['GET']),
+        Route('/ready', ready_check, methods=['GET']),
+        Route('/info', get_info, methods=['GET']),
+        Route('/metrics', get_metrics, methods=['GET']),
+        Route('/analyze_image', analyze_image, methods=['POST']),
+        Route('/speak', speak_text, methods=['POST']),
+        Route('/speak/{job_id}', speech_status, methods=['GET']),
+        WebSocketRoute('/stream', stream_analysis),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("Starting VIT-GPT AI Service (production mode)...")
+    print(f"Service will be available at: http://localhost:{PORT}")
+    print(f"Frame stream (WebSocket): ws://localhost:{PORT}/stream?mode=scene_description")
+    print(f"Inference concurrency: {INFERENCE_CONCURRENCY}, request timeout: {REQUEST_TIMEOUT}s")
+    uvicorn.run(app, host=HOST, port=PORT, log_level='info')
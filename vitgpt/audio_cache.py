@@ -0,0 +1,276 @@
+"""
+Pre-rendered speech audio cache
+Known phrases are rendered to WAV once at startup and novel text is rendered
+on demand; entries are evicted least-recently-used when the total size passes
+a byte budget. Text starting with a cached prefix reuses the prefix audio and
+only renders the remainder.
+"""
+
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """Cache key for a phrase: collapsed whitespace"""
+    return ' '.join(text.split())
+
+
+def join_wav(parts):
+    """Concatenate WAV clips that share one format into a single WAV"""
+    output = io.BytesIO()
+    writer = None
+    for part in parts:
+        with wave.open(io.BytesIO(part), 'rb') as reader:
+            if writer is None:
+                writer = wave.open(output, 'wb')
+                writer.setparams(reader.getparams())
+            elif reader.getparams()[:3] != writer.getparams()[:3]:
+                raise ValueError('WAV clips have different formats')
+            writer.writeframes(reader.readframes(reader.getnframes()))
+    if writer is not None:
+        writer.close()
+    return output.getvalue()
+
+
+def wav_duration(data):
+    """Length of a WAV clip in seconds"""
+    with wave.open(io.BytesIO(data), 'rb') as reader:
+        return reader.getnframes() / float(reader.getframerate() or 1)
+
+
+def _temp_wav(data):
+    fd, path = tempfile.mkstemp(suffix='.wav')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class ProcessPlayback:
+    """WAV clip played by a command-line player in a child process"""
+
+    def __init__(self, command, data):
+        self._path = _temp_wav(data)
+        self._process = subprocess.Popen(command + [self._path], stdout=subprocess.DEVNULL,
+                                         stderr=subprocess.DEVNULL)
+
+    def wait(self, timeout=None):
+        """True once playback has finished, False if still playing after timeout seconds"""
+        try:
+            self._process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            return False
+        _remove(self._path)
+        return True
+
+    def stop(self):
+        """Cut playback off"""
+        if self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(2)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+        _remove(self._path)
+
+
+class WinsoundPlayback:
+    """WAV clip played asynchronously by winsound; it reports no completion, so the clip length is used"""
+
+    def __init__(self, data):
+        import winsound
+
+        self._winsound = winsound
+        # SND_ASYNC cannot be combined with SND_MEMORY, so play from a file
+        self._path = _temp_wav(data)
+        self._ends_at = time.monotonic() + wav_duration(data)
+        winsound.PlaySound(self._path, winsound.SND_FILENAME | winsound.SND_ASYNC)
+
+    def wait(self, timeout=None):
+        """True once playback has finished, False if still playing after timeout seconds"""
+        remaining = self._ends_at - time.monotonic()
+        if timeout is not None and remaining > timeout:
+            time.sleep(timeout)
+            return False
+        time.sleep(max(0.0, remaining))
+        _remove(self._path)
+        return True
+
+    def stop(self):
+        """Cut playback off"""
+        self._winsound.PlaySound(None, 0)
+        _remove(self._path)
+
+
+def wav_player():
+    """Function starting playback of WAV bytes, or None where there is no player
+
+    The function returns at once with a playback handle: wait(timeout) is True
+    once the clip has finished and stop() cuts it off, so urgent speech can
+    interrupt cached audio. Windows uses winsound; elsewhere the first
+    command-line player found: aplay or paplay on Linux, afplay on macOS.
+    """
+    try:
+        import winsound  # noqa: F401
+        return WinsoundPlayback
+    except ImportError:
+        pass
+
+    commands = (('afplay',),) if sys.platform == 'darwin' else (('aplay', '-q'), ('paplay',))
+    for command in commands:
+        path = shutil.which(command[0])
+        if path:
+            return lambda data: ProcessPlayback([path] + list(command[1:]), data)
+    return None
+
+
+class AudioCache:
+    """Byte-budgeted LRU cache of rendered WAV audio keyed by phrase"""
+
+    def __init__(self, render, max_bytes=16 * 1024 * 1024, prefixes=()):
+        """
+        render:    callable turning text into WAV bytes
+        max_bytes: total audio kept; least recently used unpinned entries go first
+        prefixes:  leading phrases rendered once and joined onto the rest of the text
+        """
+        self.render = render
+        self.max_bytes = max_bytes
+        self.prefixes = [normalize_text(prefix) for prefix in prefixes]
+
+        self._entries = OrderedDict()  # key -> WAV bytes
+        self._pinned = set()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.prefix_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def peek(self, text):
+        """Cached audio for text, or None without rendering anything"""
+        key = normalize_text(text)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return data
+
+    def lookup(self, text):
+        """Cached audio for text without rendering anything; returns (audio, remainder)
+
+        An exact hit gives the whole phrase and an empty remainder. Text starting
+        with a cached prefix gives the prefix audio and the text still to be
+        spoken after it. Otherwise the result is (None, text).
+        """
+        data = self.peek(text)
+        if data is not None:
+            return data, ''
+        key = normalize_text(text)
+        for prefix in self.prefixes:
+            rest = key[len(prefix):].strip()
+            if key.startswith(prefix) and rest:
+                with self._lock:
+                    head = self._entries.get(prefix)
+                    if head is not None:
+                        self._entries.move_to_end(prefix)
+                        self.prefix_hits += 1
+                if head is not None:
+                    return head, rest
+        return None, text
+
+    def get(self, text, **render_options):
+        """Audio for text, rendering and caching it on a miss; returns (bytes, hit)
+
+        render_options are passed on to the render callable for this miss only.
+        """
+        data = self.peek(text)
+        if data is not None:
+            return data, True
+
+        key = normalize_text(text)
+        with self._lock:
+            self.misses += 1
+        data = self._render_with_prefix(key, **render_options)
+        self._store(key, data)
+        return data, False
+
+    def preload(self, phrases):
+        """Render phrases that must stay cached; returns how many were rendered"""
+        rendered = 0
+        for phrase in list(phrases) + self.prefixes:
+            key = normalize_text(phrase)
+            with self._lock:
+                cached = key in self._entries
+                self._pinned.add(key)
+            if cached:
+                continue
+            try:
+                self._store(key, self.render(key))
+                rendered += 1
+            except Exception as e:
+                print(f"Audio pre-render failed for '{key}': {e}")
+                with self._lock:
+                    self._pinned.discard(key)
+        return rendered
+
+    def _render_with_prefix(self, key, **render_options):
+        """Render key, reusing cached audio for a known leading phrase"""
+        for prefix in self.prefixes:
+            rest = key[len(prefix):].strip()
+            if key.startswith(prefix) and rest:
+                with self._lock:
+                    head = self._entries.get(prefix)
+                if head is not None:
+                    try:
+                        return join_wav([head, self.render(rest, **render_options)])
+                    except (ValueError, wave.Error):
+                        break
+        return self.render(key, **render_options)
+
+    def _store(self, key, data):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= len(previous)
+            self._entries[key] = data
+            self.total_bytes += len(data)
+
+            for candidate in list(self._entries):
+                if self.total_bytes <= self.max_bytes:
+                    break
+                if candidate in self._pinned or candidate == key:
+                    continue
+                self.total_bytes -= len(self._entries.pop(candidate))
+                self.evictions += 1
+
+    def stats(self):
+        """Size and hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'pinned': len(self._pinned),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'prefix_hits': self.prefix_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
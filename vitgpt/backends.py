@@ -0,0 +1,266 @@
+"""
+Inference backends for the VIT-GPT captioning model
+Every backend is a callable that takes a list of PIL images and returns one
+pipeline-style result per image: [[{'generated_text': ...}], ...]
+
+  pytorch    eager fp32 transformers model (reference)
+  quantized  dynamic int8 quantization of the ViT encoder and GPT-2 decoder linear layers
+  onnx       ONNX export of encoder and decoder run through ONNX Runtime with a greedy decoding
+             loop that feeds the decoder's key/value cache back in, one new token per step
+"""
+
+import os
+
+from preprocess import processor_settings, to_pixel_values
+
+MODEL_NAME = "nlpconnect/vit-gpt2-image-captioning"
+BACKENDS = ('pytorch', 'quantized', 'onnx')
+DEFAULT_ONNX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'onnx_model')
+
+
+class PipelineBackend:
+    """Reference backend: the eager PyTorch model, fed by the numpy preprocessing fast path"""
+
+    name = 'pytorch'
+
+    def __init__(self, model_name=MODEL_NAME):
+        from transformers import AutoTokenizer, VisionEncoderDecoderModel, ViTImageProcessor
+
+        self.model = VisionEncoderDecoderModel.from_pretrained(model_name).eval()
+        self.image_processor = ViTImageProcessor.from_pretrained(model_name)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self._pixel_settings = processor_settings(self.image_processor)
+
+    def __call__(self, images):
+        import torch
+
+        # Same resize and normalisation as the HF image processor, without its PIL round trips
+        pixel_values = torch.from_numpy(to_pixel_values(images, **self._pixel_settings))
+        with torch.no_grad():
+            output_ids = self.model.generate(pixel_values=pixel_values.to(self.model.device))
+        texts = self.tokenizer.batch_decode(output_ids, skip_special_tokens=True)
+        return [[{'generated_text': text.strip()}] for text in texts]
+
+    def make_engine(self, **kwargs):
+        """Split encoder/decoder engine sharing this backend's model and tokenizer"""
+        from captioning_engine import CaptioningEngine
+
+        return CaptioningEngine(self.model, self.image_processor, self.tokenizer, **kwargs)
+
+
+class QuantizedBackend(PipelineBackend):
+    """Eager model with dynamic int8 quantization of all linear layers"""
+
+    name = 'quantized'
+
+    def __init__(self, model_name=MODEL_NAME):
+        import torch
+
+        super().__init__(model_name)
+        # GPT-2 implements its projections as Conv1D, which dynamic
+        # quantization ignores, so turn them into nn.Linear first
+        _conv1d_to_linear(self.model.decoder)
+        torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def _conv1d_to_linear(module):
+    """Replace transformers Conv1D layers with equivalent nn.Linear layers in place"""
+    import torch
+    from transformers.pytorch_utils import Conv1D
+
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            in_features, out_features = child.weight.shape
+            linear = torch.nn.Linear(in_features, out_features)
+            with torch.no_grad():
+                linear.weight.copy_(child.weight.t())
+                linear.bias.copy_(child.bias)
+            setattr(module, name, linear)
+        else:
+            _conv1d_to_linear(child)
+
+
+class OnnxBackend:
+    """ONNX Runtime encoder and decoder sessions with a greedy decoding loop"""
+
+    name = 'onnx'
+
+    def __init__(self, model_name=MODEL_NAME, onnx_dir=DEFAULT_ONNX_DIR, max_length=None):
+        from transformers import AutoConfig, AutoTokenizer, GenerationConfig, ViTImageProcessor
+
+        self.onnx_dir = onnx_dir
+        self.processor = ViTImageProcessor.from_pretrained(model_name)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = None  # weights live in the ONNX files, nothing to share
+
+        encoder_path = os.path.join(onnx_dir, 'encoder.onnx')
+        decoder_path = os.path.join(onnx_dir, 'decoder.onnx')
+        decoder_with_past_path = os.path.join(onnx_dir, 'decoder_with_past.onnx')
+        # Exports without decoder_with_past.onnx predate the key/value cache; redo them
+        if not all(os.path.exists(p) for p in (encoder_path, decoder_path, decoder_with_past_path)):
+            export_onnx(model_name, onnx_dir)
+
+        config = AutoConfig.from_pretrained(model_name)
+        try:
+            generation = GenerationConfig.from_pretrained(model_name)
+        except OSError:
+            generation = GenerationConfig.from_model_config(config)
+        self.start_token_id = config.decoder_start_token_id or config.decoder.bos_token_id
+        self.eos_token_id = config.eos_token_id or config.decoder.eos_token_id
+        self.pad_token_id = config.pad_token_id if config.pad_token_id is not None else self.eos_token_id
+        self.max_length = max_length or generation.max_length or 20
+        self.past_names = _past_names(config.decoder.n_layer)
+
+        self._pixel_settings = processor_settings(self.processor)
+        self._encoder_path = encoder_path
+        self._decoder_path = decoder_path
+        self._decoder_with_past_path = decoder_with_past_path
+        self._sessions = None
+        self._pid = None
+
+    def make_engine(self, **kwargs):
+        """No split engine for ONNX sessions; per-request decoding is not supported"""
+        return None
+
+    def __getstate__(self):
+        # Sessions cannot be pickled; each process creates its own
+        state = dict(self.__dict__)
+        state['_sessions'] = None
+        return state
+
+    def _get_sessions(self):
+        """Create ONNX Runtime sessions lazily, once per process (safe across fork)"""
+        if self._sessions is None or self._pid != os.getpid():
+            import onnxruntime as ort
+
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            self._sessions = tuple(
+                ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+                for path in (self._encoder_path, self._decoder_path, self._decoder_with_past_path)
+            )
+            self._pid = os.getpid()
+        return self._sessions
+
+    def __call__(self, images):
+        import numpy as np
+
+        encoder, decoder, decoder_with_past = self._get_sessions()
+        pixel_values = to_pixel_values(images, **self._pixel_settings)
+        hidden_states = encoder.run(None, {'pixel_values': pixel_values})[0]
+
+        batch_size = len(images)
+        input_ids = np.full((batch_size, 1), self.start_token_id, dtype=np.int64)
+        finished = np.zeros(batch_size, dtype=bool)
+
+        # The first step fills the key/value cache; later steps feed only the newest token
+        outputs = decoder.run(None, {'input_ids': input_ids, 'encoder_hidden_states': hidden_states})
+        for _ in range(self.max_length - 1):
+            logits, past = outputs[0], outputs[1:]
+            next_ids = logits[:, -1, :].argmax(axis=-1)
+            next_ids = np.where(finished, self.pad_token_id, next_ids)[:, None].astype(np.int64)
+            input_ids = np.concatenate([input_ids, next_ids], axis=1)
+            finished |= next_ids[:, 0] == self.eos_token_id
+            if finished.all():
+                break
+            feed = dict(zip(self.past_names, past))
+            feed.update(input_ids=next_ids, encoder_hidden_states=hidden_states)
+            outputs = decoder_with_past.run(None, feed)
+
+        texts = self.tokenizer.batch_decode(input_ids, skip_special_tokens=True)
+        return [[{'generated_text': text.strip()}] for text in texts]
+
+
+def _past_names(num_layers, prefix='past'):
+    """ONNX input (or output, with prefix 'present') names of the decoder key/value cache"""
+    return [f'{prefix}_{layer}_{kind}' for layer in range(num_layers) for kind in ('key', 'value')]
+
+
+def export_onnx(model_name=MODEL_NAME, onnx_dir=DEFAULT_ONNX_DIR, opset=14):
+    """Export the ViT encoder and GPT-2 decoder of the captioning model to ONNX"""
+    import torch
+    from transformers import VisionEncoderDecoderModel
+
+    print(f"Exporting {model_name} to ONNX in {onnx_dir}...")
+    os.makedirs(onnx_dir, exist_ok=True)
+    model = VisionEncoderDecoderModel.from_pretrained(model_name).eval()
+
+    class Encoder(torch.nn.Module):
+        def __init__(self, encoder):
+            super().__init__()
+            self.encoder = encoder
+
+        def forward(self, pixel_values):
+            return self.encoder(pixel_values=pixel_values).last_hidden_state
+
+    class Decoder(torch.nn.Module):
+        """GPT-2 decoder returning logits and its self-attention key/value cache"""
+
+        def __init__(self, decoder):
+            super().__init__()
+            self.decoder = decoder
+
+        def forward(self, input_ids, encoder_hidden_states, *past):
+            past_key_values = tuple(zip(past[::2], past[1::2])) if past else None
+            output = self.decoder(
+                input_ids=input_ids,
+                encoder_hidden_states=encoder_hidden_states,
+                past_key_values=past_key_values,
+                use_cache=True,
+            )
+            return (output.logits,) + tuple(t for layer in output.past_key_values for t in layer)
+
+    num_layers = model.config.decoder.n_layer
+    past_names = _past_names(num_layers)
+    present_names = _past_names(num_layers, 'present')
+    present_axes = {name: {0: 'batch', 2: 'total_sequence'} for name in present_names}
+
+    size = model.config.encoder.image_size
+    pixel_values = torch.randn(1, 3, size, size)
+    decoder = Decoder(model.decoder).eval()
+    with torch.no_grad():
+        hidden_states = model.encoder(pixel_values=pixel_values).last_hidden_state
+        input_ids = torch.tensor([[model.config.decoder_start_token_id or model.config.decoder.bos_token_id]])
+        past = decoder(input_ids, hidden_states)[1:]
+
+        torch.onnx.export(
+            Encoder(model.encoder), (pixel_values,), os.path.join(onnx_dir, 'encoder.onnx'),
+            input_names=['pixel_values'], output_names=['last_hidden_state'],
+            dynamic_axes={'pixel_values': {0: 'batch'}, 'last_hidden_state': {0: 'batch'}},
+            opset_version=opset,
+        )
+        # First step: start token only, no cache yet
+        torch.onnx.export(
+            decoder, (input_ids, hidden_states), os.path.join(onnx_dir, 'decoder.onnx'),
+            input_names=['input_ids', 'encoder_hidden_states'], output_names=['logits'] + present_names,
+            dynamic_axes=dict({
+                'input_ids': {0: 'batch', 1: 'sequence'},
+                'encoder_hidden_states': {0: 'batch'},
+                'logits': {0: 'batch', 1: 'sequence'},
+            }, **present_axes),
+            opset_version=opset,
+        )
+        # Later steps: one new token plus the cache from the previous step
+        torch.onnx.export(
+            decoder, (input_ids, hidden_states) + tuple(past), os.path.join(onnx_dir, 'decoder_with_past.onnx'),
+            input_names=['input_ids', 'encoder_hidden_states'] + past_names,
+            output_names=['logits'] + present_names,
+            dynamic_axes=dict({
+                'input_ids': {0: 'batch'},
+                'encoder_hidden_states': {0: 'batch'},
+                'logits': {0: 'batch'},
+            }, **{name: {0: 'batch', 2: 'past_sequence'} for name in past_names}, **present_axes),
+            opset_version=opset,
+        )
+    print("ONNX export complete")
+
+
+def load_backend(name, model_name=MODEL_NAME):
+    """Create the named inference backend"""
+    if name == 'pytorch':
+        return PipelineBackend(model_name)
+    if name == 'quantized':
+        return QuantizedBackend(model_name)
+    if name == 'onnx':
+        return OnnxBackend(model_name)
+    raise ValueError(f"Unknown backend '{name}', expected one of: {', '.join(BACKENDS)}")
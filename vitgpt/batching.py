@@ -0,0 +1,187 @@
+"""
+Dynamic micro-batching for the VIT-GPT captioning model
+Collects concurrent caption requests for a short window and runs them
+through the model as a single batched call. Queued requests are taken in
+priority order (lower value first), then in arrival order.
+"""
+
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from admission import DeadlineExceeded
+
+
+class BatchScheduler:
+    """Group concurrent inference requests into batched model calls"""
+
+    def __init__(self, infer_fn, max_batch_size=8, batch_window_ms=10,
+                 max_latency_ms=None, max_inflight_batches=1):
+        """
+        infer_fn:        callable taking a list of images and returning one
+                         result per image (same shape as pipe([...]))
+        max_batch_size:  upper limit of images per model call
+        batch_window_ms: how long the first request of a batch waits for others
+        max_latency_ms:  optional latency budget; batches are capped so the
+                         window plus the expected batch run time stays inside it
+        max_inflight_batches: batches allowed to run at once (e.g. one per
+                         worker process); requests queue up while all are busy
+        """
+        self.infer_fn = infer_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.batch_window = max(0.0, batch_window_ms / 1000.0)
+        self.max_latency = max_latency_ms / 1000.0 if max_latency_ms else None
+
+        self._queue = queue.PriorityQueue()  # (priority, sequence, (image, future) or None)
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._per_image_cost = None  # EWMA of seconds per image in a batch
+        self._batches = 0
+        self._images = 0
+        self._errors = 0
+        self._expired = 0
+
+        self.max_inflight_batches = max(1, int(max_inflight_batches))
+        self._slots = threading.Semaphore(self.max_inflight_batches)
+        self._executor = None
+        if self.max_inflight_batches > 1:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_inflight_batches, thread_name_prefix='batch-runner')
+
+        self._thread = threading.Thread(target=self._run, name='batch-scheduler', daemon=True)
+        self._thread.start()
+
+    def submit(self, image, deadline=None, priority=0):
+        """Queue an image for captioning and return a Future for its result
+
+        deadline: time.monotonic() value after which the image is dropped
+                  instead of being run through the model
+        priority: lower values are batched first
+        """
+        future = Future()
+        future.deadline = deadline
+        self._queue.put((priority, next(self._sequence), (image, future)))
+        return future
+
+    def caption(self, image, timeout=None, deadline=None, priority=0):
+        """Caption a single image, blocking until its batch has been processed"""
+        return self.submit(image, deadline, priority).result(timeout=timeout)
+
+    def stop(self):
+        """Stop the scheduler thread once queued work has been drained"""
+        self._queue.put((float('inf'), next(self._sequence), None))
+        self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def stats(self):
+        """Return batching counters for monitoring"""
+        with self._lock:
+            return {
+                'batches': self._batches,
+                'images': self._images,
+                'errors': self._errors,
+                'expired': self._expired,
+                'avg_batch_size': round(self._images / self._batches, 2) if self._batches else 0.0,
+                'max_batch_size': self.max_batch_size,
+                'batch_window_ms': self.batch_window * 1000.0,
+                'max_inflight_batches': self.max_inflight_batches,
+                'queued': self._queue.qsize(),
+            }
+
+    def _batch_limit(self):
+        """Largest batch that still fits the latency budget"""
+        if self.max_latency is None or self._per_image_cost is None:
+            return self.max_batch_size
+        budget = self.max_latency - self.batch_window
+        fitting = int(budget / self._per_image_cost) if self._per_image_cost > 0 else self.max_batch_size
+        return max(1, min(self.max_batch_size, fitting))
+
+    def _run(self):
+        """Scheduler loop: wait for a request, gather more for the window, run the batch"""
+        while True:
+            # Hold requests in the queue while every batch slot is busy so
+            # the next batch picks up everything that arrived meanwhile
+            self._slots.acquire()
+            first = self._queue.get()[2]
+            if first is None:
+                self._slots.release()
+                return
+
+            batch = [first]
+            limit = self._batch_limit()
+            window_end = time.monotonic() + self.batch_window
+            stopping = False
+
+            while len(batch) < limit:
+                remaining = window_end - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)[2]
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            if self._executor is not None:
+                self._executor.submit(self._run_batch, batch)
+            else:
+                self._run_batch(batch)
+            if stopping:
+                return
+
+    def _run_batch(self, batch):
+        """Run one model call, hand each result back to its request and free the slot"""
+        try:
+            self._process_batch(batch)
+        finally:
+            self._slots.release()
+
+    def _process_batch(self, batch):
+        """Run one model call and hand each result back to its request"""
+        # Skip requests whose caller already gave up or whose deadline has passed
+        now = time.monotonic()
+        live = []
+        for image, future in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            if future.deadline is not None and future.deadline <= now:
+                future.set_exception(DeadlineExceeded('Deadline passed before inference'))
+                with self._lock:
+                    self._expired += 1
+                continue
+            live.append((image, future))
+        batch = live
+        if not batch:
+            return
+
+        images = [image for image, _ in batch]
+        start = time.perf_counter()
+        try:
+            results = self.infer_fn(images)
+            if len(results) != len(images):
+                raise RuntimeError(f"Model returned {len(results)} results for {len(images)} images")
+        except Exception as e:
+            with self._lock:
+                self._errors += 1
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._batches += 1
+            self._images += len(images)
+            cost = elapsed / len(images)
+            if self._per_image_cost is None:
+                self._per_image_cost = cost
+            else:
+                self._per_image_cost = 0.8 * self._per_image_cost + 0.2 * cost
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
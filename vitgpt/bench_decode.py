@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+JPEG Decode Micro-benchmark
+Measures per-frame decode-to-pixel-tensor time and peak memory for the
+original full-resolution paths and the reduced-scale fast paths.
+
+Usage: python bench_decode.py [--image frame.jpg] [--size 1600x1200] [--frames 200]
+"""
+
+import argparse
+import io
+import multiprocessing
+import resource
+import statistics
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from preprocess import MODEL_INPUT_SIZE, decode_frame, decode_image, frame_to_image, to_pixel_values
+
+
+def baseline_pixel_values(image):
+    """Resize and normalise the way the ViT processor does, without the fast path's in-place work"""
+    resized = image.resize((MODEL_INPUT_SIZE, MODEL_INPUT_SIZE), Image.BILINEAR)
+    array = np.asarray(resized).astype(np.float32) / 255.0
+    array = (array - 0.5) / 0.5
+    return array.transpose(2, 0, 1)[None].copy()
+
+
+def server_baseline(data):
+    """Original server.py path: full decode, convert('RGB'), processor-style normalise"""
+    image = Image.open(io.BytesIO(data))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return baseline_pixel_values(image)
+
+
+def server_fast(data):
+    """server.py path: PIL draft() decode at reduced scale, in-place normalise"""
+    return to_pixel_values([decode_image(data)])
+
+
+def loop_baseline(data):
+    """Original vitgpt.py path: imdecode, cvtColor, Image.fromarray, normalise"""
+    frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    return baseline_pixel_values(image)
+
+
+def loop_fast(data):
+    """vitgpt.py path: IMREAD_REDUCED_* decode, one colour conversion, in-place normalise"""
+    return to_pixel_values([frame_to_image(decode_frame(data))])
+
+
+VARIANTS = {
+    'server_baseline': server_baseline,
+    'server_fast': server_fast,
+    'loop_baseline': loop_baseline,
+    'loop_fast': loop_fast,
+}
+
+
+def synthetic_jpeg(width, height, quality=85):
+    """Build a JPEG with gradients and noise so it compresses like a camera frame"""
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    noise = np.random.default_rng(0).normal(0, 20, (height, width, 3))
+    pixels = np.clip(np.dstack([x + 0 * y, y + 0 * x, (x + y) / 2]) + noise, 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def run_variant(name, data, frames, results):
+    """Time one variant in a fresh process so its peak RSS is measured in isolation"""
+    fn = VARIANTS[name]
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    fn(data)  # warm-up
+
+    tracemalloc.start()
+    timings = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        fn(data)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put({
+        'variant': name,
+        'mean_ms': round(statistics.mean(timings), 3),
+        'p95_ms': round(sorted(timings)[int(0.95 * (len(timings) - 1))], 3),
+        'traced_peak_kb': round(traced_peak / 1024.0, 1),
+        'rss_growth_kb': rss_after - rss_before,
+    })
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Benchmark JPEG decode fast paths')
+    parser.add_argument('--image', help='JPEG file to decode (default: synthetic frame)')
+    parser.add_argument('--size', default='1600x1200', help='synthetic frame size, WIDTHxHEIGHT')
+    parser.add_argument('--frames', type=int, default=200, help='timed decodes per variant')
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, 'rb') as f:
+            data = f.read()
+    else:
+        width, height = (int(v) for v in args.size.lower().split('x'))
+        data = synthetic_jpeg(width, height)
+
+    width, height = Image.open(io.BytesIO(data)).size
+    print("JPEG Decode Micro-benchmark")
+    print("=" * 40)
+    print(f"Frame: {width}x{height}, {len(data)} bytes, {args.frames} decodes per variant")
+    print(f"Reduced sizes: PIL draft -> {decode_image(data).size}, "
+          f"OpenCV reduced -> {decode_frame(data).shape[1::-1]}")
+    print()
+
+    results = multiprocessing.Queue()
+    rows = []
+    for name in VARIANTS:
+        process = multiprocessing.Process(target=run_variant, args=(name, data, args.frames, results))
+        process.start()
+        rows.append(results.get())
+        process.join()
+
+    print(f"{'Variant':<18}{'Mean (ms)':>11}{'p95 (ms)':>10}{'Traced peak (KB)':>18}{'RSS growth (KB)':>17}")
+    for row in rows:
+        print(f"{row['variant']:<18}{row['mean_ms']:>11}{row['p95_ms']:>10}"
+              f"{row['traced_peak_kb']:>18}{row['rss_growth_kb']:>17}")
+
+    by_name = {row['variant']: row for row in rows}
+    for prefix in ('server', 'loop'):
+        baseline, fast = by_name[f'{prefix}_baseline'], by_name[f'{prefix}_fast']
+        print(f"\n{prefix}: {baseline['mean_ms'] / fast['mean_ms']:.2f}x faster per frame")
+
+
+if __name__ == '__main__':
+    main()
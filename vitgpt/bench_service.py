@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Analysis Service Load Benchmark
+Replays a folder of JPEGs against a running /analyze_image endpoint, either
+closed-loop at a fixed concurrency or open-loop at a fixed request rate, once
+per mode, and reports throughput, latency percentiles and error rate as JSON
+so builds and backends can be compared and regressions caught.
+Requests carry Cache-Control: no-cache so replayed frames are not answered
+from the service's result or caption caches; --allow-cache measures with the
+caches on, and each report gives the fraction of cached responses.
+
+Usage: python bench_service.py --images ./frames [--url http://localhost:5000]
+                               [--concurrency 4 | --rate 10] [--duration 30]
+                               [--modes scene_description navigation] [--json report.json]
+                               [--baseline previous.json] [--allow-cache]
+"""
+
+import argparse
+import glob
+import itertools
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg')
+DEFAULT_MODES = ('scene_description', 'navigation')
+REJECTION_STATUSES = (429, 503)  # admission control: superseded, queue full
+
+
+def load_frames(folder, limit=None):
+    """Read JPEG files from a folder as (filename, bytes) pairs"""
+    paths = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(folder, pattern)))
+    if limit:
+        paths = paths[:limit]
+    frames = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            frames.append((os.path.basename(path), f.read()))
+    return frames
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class Client:
+    """Posts frames to /analyze_image over one keep-alive session per thread
+
+    Each sender thread names itself with its own X-Client-Id. The service keeps
+    only the newest waiting frame per client, so senders sharing the default
+    id (their address) would supersede each other instead of loading it.
+    """
+
+    def __init__(self, url, raw=False, timeout=30.0, allow_cache=False):
+        self.endpoint = url.rstrip('/') + '/analyze_image'
+        self.raw = raw
+        self.timeout = timeout
+        # Without this every replayed frame after the first pass is a cache hit
+        self.headers = {} if allow_cache else {'Cache-Control': 'no-cache'}
+        self._local = threading.local()
+        self._senders = itertools.count()
+        self._run_id = f'{os.getpid()}-{int(time.time())}'
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.headers['X-Client-Id'] = f'bench-{self._run_id}-{next(self._senders)}'
+        return session
+
+    def post(self, frame, mode):
+        """Send one frame; returns (HTTP status or None, error string or None, cached flag or None)"""
+        filename, data = frame
+        try:
+            if self.raw:
+                response = self._session().post(
+                    self.endpoint, data=data, params={'mode': mode},
+                    headers=dict(self.headers, **{'Content-Type': 'image/jpeg'}), timeout=self.timeout)
+            else:
+                response = self._session().post(
+                    self.endpoint, files={'image': (filename, data, 'image/jpeg')},
+                    data={'mode': mode}, headers=self.headers, timeout=self.timeout)
+        except requests.exceptions.Timeout:
+            return None, 'timeout', None
+        except requests.exceptions.RequestException as e:
+            return None, type(e).__name__, None
+        if response.status_code != 200:
+            return response.status_code, f'http_{response.status_code}', None
+        try:
+            cached = bool(response.json().get('cached'))
+        except (ValueError, AttributeError):
+            cached = None
+        return 200, None, cached
+
+
+def timed_post(client, frame, mode, scheduled):
+    """Post a frame and measure latency from when it was meant to be sent"""
+    status, error, cached = client.post(frame, mode)
+    return {'status': status, 'error': error, 'cached': cached,
+            'latency_ms': (time.perf_counter() - scheduled) * 1000.0}
+
+
+def run_closed_loop(client, frames, mode, concurrency, duration, max_requests):
+    """Keep `concurrency` requests in flight until the duration or request budget runs out"""
+    records = []
+    lock = threading.Lock()
+    frame_cycle = itertools.cycle(frames)
+    sent = itertools.count()
+    stop_at = time.perf_counter() + duration
+
+    def worker():
+        while time.perf_counter() < stop_at:
+            with lock:
+                if max_requests and next(sent) >= max_requests:
+                    return
+                frame = next(frame_cycle)
+            record = timed_post(client, frame, mode, time.perf_counter())
+            with lock:
+                records.append(record)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return records
+
+
+def run_open_loop(client, frames, mode, rate, duration, max_requests, max_inflight):
+    """Send requests on a fixed schedule regardless of how fast the server answers
+
+    Latency counts from each request's scheduled send time, so time spent waiting
+    for a free sender when the service falls behind is included rather than hidden.
+    """
+    interval = 1.0 / rate
+    total = int(rate * duration)
+    if max_requests:
+        total = min(total, max_requests)
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_inflight) as executor:
+        start = time.perf_counter()
+        for i, frame in zip(range(total), itertools.cycle(frames)):
+            scheduled = start + i * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(timed_post, client, frame, mode, scheduled))
+    return [future.result() for future in futures]
+
+
+def summarise(records, elapsed):
+    """Throughput, latency percentiles, error breakdown and cache hit fraction for one run"""
+    ok = [r['latency_ms'] for r in records if r['error'] is None]
+    cached = [r['cached'] for r in records if r['error'] is None and r.get('cached') is not None]
+    errors = {}
+    for record in records:
+        if record['error'] is not None:
+            errors[record['error']] = errors.get(record['error'], 0) + 1
+    # Admission control turning requests away is load shedding, not a broken transport
+    rejected = {status: sum(1 for r in records if r['status'] == status) for status in REJECTION_STATUSES}
+    transport_errors = sum(1 for r in records if r['error'] is not None and r['status'] is None)
+    summary = {
+        'requests': len(records),
+        'succeeded': len(ok),
+        'failed': len(records) - len(ok),
+        'error_rate': round((len(records) - len(ok)) / len(records), 4) if records else 0.0,
+        'errors': errors,
+        'rejected': {'superseded_429': rejected[429], 'queue_full_503': rejected[503]},
+        'transport_errors': transport_errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(ok) / elapsed, 2) if elapsed > 0 else 0.0,
+        'cached_fraction': round(sum(cached) / len(cached), 4) if cached else None,
+        'latency_ms': None,
+    }
+    if ok:
+        summary['latency_ms'] = {
+            'mean': round(statistics.mean(ok), 1),
+            'p50': round(percentile(ok, 50), 1),
+            'p95': round(percentile(ok, 95), 1),
+            'p99': round(percentile(ok, 99), 1),
+            'max': round(max(ok), 1),
+        }
+    return summary
+
+
+def run_mode(client, frames, mode, args):
+    """Warm up, then benchmark one mode with the configured load pattern"""
+    for frame in frames[:args.warmup]:
+        client.post(frame, mode)
+
+    start = time.perf_counter()
+    if args.rate:
+        records = run_open_loop(client, frames, mode, args.rate, args.duration, args.requests, args.max_inflight)
+    else:
+        records = run_closed_loop(client, frames, mode, args.concurrency, args.duration, args.requests)
+    result = summarise(records, time.perf_counter() - start)
+    result['mode'] = mode
+    return result
+
+
+def service_info(url):
+    """Backend and serving details from /info, so reports say what was measured"""
+    try:
+        info = requests.get(url.rstrip('/') + '/info', timeout=5).json()
+    except (requests.exceptions.RequestException, ValueError):
+        return {}
+    return {
+        'backend': info.get('backend'),
+        'serving': (info.get('serving') or {}).get('mode', 'flask'),
+        'model': info.get('model'),
+    }
+
+
+def find_regressions(results, baseline, max_regression, compare_throughput=True):
+    """Modes whose p95 latency, throughput or error rate got worse than the baseline allows
+
+    Throughput is only meaningful to compare between closed-loop runs at the same
+    concurrency; an open loop sends at whatever rate it was told to.
+    """
+    previous = {r['mode']: r for r in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        before = previous.get(result['mode'])
+        if not before or not before.get('latency_ms') or not result['latency_ms']:
+            continue
+        limit = 1.0 + max_regression / 100.0
+        if result['latency_ms']['p95'] > before['latency_ms']['p95'] * limit:
+            regressions.append(f"{result['mode']}: p95 {before['latency_ms']['p95']} -> "
+                               f"{result['latency_ms']['p95']} ms")
+        if compare_throughput and result['throughput_rps'] * limit < before['throughput_rps']:
+            regressions.append(f"{result['mode']}: throughput {before['throughput_rps']} -> "
+                               f"{result['throughput_rps']} req/s")
+        if result['error_rate'] > before['error_rate'] + 0.01:
+            regressions.append(f"{result['mode']}: error rate {before['error_rate']} -> {result['error_rate']}")
+    return regressions
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Load-test the VIT-GPT analysis service')
+    parser.add_argument('--images', required=True, help='folder of JPEG frames to replay')
+    parser.add_argument('--url', default='http://localhost:5000', help='service base URL')
+    parser.add_argument('--modes', nargs='+', default=list(DEFAULT_MODES), help='analysis modes to benchmark')
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument('--concurrency', type=int, default=4, help='closed loop: requests kept in flight')
+    load.add_argument('--rate', type=float, help='open loop: requests per second')
+    parser.add_argument('--max-inflight', type=int, default=64, help='open loop: most concurrent senders')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds per mode')
+    parser.add_argument('--requests', type=int, default=None, help='stop each mode after this many requests')
+    parser.add_argument('--warmup', type=int, default=3, help='untimed requests per mode')
+    parser.add_argument('--raw', action='store_true', help='send raw image/jpeg bodies instead of multipart')
+    parser.add_argument('--allow-cache', action='store_true',
+                        help='let the service answer from its result and caption caches')
+    parser.add_argument('--timeout', type=float, default=30.0, help='per-request timeout in seconds')
+    parser.add_argument('--limit', type=int, default=None, help='maximum number of images')
+    parser.add_argument('--json', help='write the report to this file ("-" for stdout)')
+    parser.add_argument('--baseline', help='earlier report to compare against; exits 1 on regression')
+    parser.add_argument('--max-regression', type=float, default=10.0,
+                        help='allowed percent change in p95 latency or throughput vs the baseline')
+    args = parser.parse_args()
+
+    frames = load_frames(args.images, args.limit)
+    if not frames:
+        print(f"❌ No JPEG images found in {args.images}", file=sys.stderr)
+        return 2
+
+    # Progress goes to stderr when the JSON report goes to stdout
+    log = sys.stderr if args.json == '-' else sys.stdout
+    load_desc = f"open loop at {args.rate} req/s" if args.rate else f"closed loop, concurrency {args.concurrency}"
+    print("VIT-GPT Service Benchmark", file=log)
+    print("=" * 40, file=log)
+    print(f"Target: {args.url}, {len(frames)} frames, {load_desc}, {args.duration}s per mode", file=log)
+
+    client = Client(args.url, raw=args.raw, timeout=args.timeout, allow_cache=args.allow_cache)
+    results = []
+    for mode in args.modes:
+        print(f"\n⚙️  Benchmarking {mode}...", file=log)
+        results.append(run_mode(client, frames, mode, args))
+
+    print(f"\n{'Mode':<20}{'Req':>7}{'Err %':>8}{'429':>6}{'503':>6}{'Net':>6}{'Cached %':>10}{'Req/s':>9}"
+          f"{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}", file=log)
+    for result in results:
+        latency = result['latency_ms'] or {}
+        cached = result['cached_fraction']
+        cached = '-' if cached is None else f'{cached * 100:.1f}'
+        rejected = result['rejected']
+        print(f"{result['mode']:<20}{result['requests']:>7}{result['error_rate'] * 100:>8.1f}"
+              f"{rejected['superseded_429']:>6}{rejected['queue_full_503']:>6}{result['transport_errors']:>6}{cached:>10}"
+              f"{result['throughput_rps']:>9}{latency.get('p50', '-'):>10}{latency.get('p95', '-'):>10}"
+              f"{latency.get('p99', '-'):>10}", file=log)
+
+    report = {
+        'timestamp': time.time(),
+        'url': args.url,
+        'service': service_info(args.url),
+        'load': {
+            'pattern': 'open' if args.rate else 'closed',
+            'rate_rps': args.rate,
+            'concurrency': None if args.rate else args.concurrency,
+            'duration_s': args.duration,
+            'max_requests': args.requests,
+            'transport': 'raw' if args.raw else 'multipart',
+            'cache': 'allowed' if args.allow_cache else 'bypassed',
+        },
+        'images': len(frames),
+        'results': results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        previous_load = baseline.get('load', {})
+        same_closed_loop = (report['load']['pattern'] == previous_load.get('pattern') == 'closed'
+                            and report['load']['concurrency'] == previous_load.get('concurrency'))
+        regressions = find_regressions(results, baseline, args.max_regression, same_closed_loop)
+        report['regressions'] = regressions
+        for regression in regressions:
+            print(f"⚠️  Regression: {regression}", file=log)
+        exit_code = 1 if regressions else 0
+
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📝 Report saved to: {args.json}", file=log)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
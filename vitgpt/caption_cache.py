@@ -0,0 +1,123 @@
+"""
+Perceptual-hash caption cache
+Near-identical frames (static scenes, camera resting on a table) reuse the
+caption of an earlier frame instead of running the model again. With
+max_distance=0 and content_hash() keys the same cache is an exact,
+content-addressed result store.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from PIL import Image
+
+
+def dhash(image, hash_size=8):
+    """Compute a difference hash of a PIL image as an integer"""
+    # Shrink first so the grayscale conversion only touches a few pixels
+    small = image.resize((hash_size + 1, hash_size), Image.BILINEAR).convert('L')
+    pixels = small.tobytes()
+    width = hash_size + 1
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * width
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def content_hash(data, *extra):
+    """BLAKE2 digest of raw bytes plus any settings that change the result"""
+    digest = hashlib.blake2b(data, digest_size=16)
+    for value in extra:
+        digest.update(repr(value).encode())
+    return digest.hexdigest()
+
+
+def hamming_distance(a, b):
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count('1')
+
+
+class CaptionCache:
+    """LRU cache of captions keyed by perceptual hash, with TTL and Hamming threshold"""
+
+    def __init__(self, max_entries=256, max_distance=5, ttl_seconds=30.0):
+        """
+        max_entries:  entries kept before the least recently used is evicted (0 disables)
+        max_distance: largest Hamming distance treated as the same scene
+        ttl_seconds:  age after which a cached caption is recomputed
+        """
+        self.max_entries = max(0, int(max_entries))
+        self.max_distance = max(0, int(max_distance))
+        self.ttl = ttl_seconds
+
+        self._entries = OrderedDict()  # hash -> (created_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, image_hash):
+        """Return the cached value for a matching hash, or None on a miss"""
+        if not self.max_entries:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            self._purge_expired(now)
+
+            match = image_hash if image_hash in self._entries else None
+            if match is None and self.max_distance:
+                best_distance = self.max_distance + 1
+                for key in self._entries:
+                    distance = hamming_distance(image_hash, key)
+                    if distance < best_distance:
+                        match, best_distance = key, distance
+
+            if match is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(match)
+            self.hits += 1
+            return self._entries[match][1]
+
+    def store(self, image_hash, value):
+        """Cache a value for a hash, evicting the least recently used entry if full"""
+        if not self.max_entries:
+            return
+
+        with self._lock:
+            self._entries[image_hash] = (time.monotonic(), value)
+            self._entries.move_to_end(image_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all cached entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def _purge_expired(self, now):
+        """Remove entries older than the TTL"""
+        if not self.ttl:
+            return
+        expired = [key for key, (created, _) in self._entries.items() if now - created > self.ttl]
+        for key in expired:
+            del self._entries[key]
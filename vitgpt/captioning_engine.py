@@ -0,0 +1,135 @@
+"""
+Captioning engine with split encoder/decoder execution
+Runs the ViT encoder and the GPT-2 decoder as separate steps so encoder
+hidden states can be cached per frame and decoding can be tuned per request
+(greedy or beam search, number of new tokens).
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import torch
+from transformers.modeling_outputs import BaseModelOutput
+
+from preprocess import processor_settings, to_pixel_values
+
+# Tokens generate() puts in front of a caption (the decoder start token)
+DECODER_PROMPT_LENGTH = 1
+
+
+class CaptioningEngine:
+    """Encode frames once, decode them as often as callers need"""
+
+    def __init__(self, model, image_processor, tokenizer, encoder_cache_size=32,
+                 max_new_tokens=None, num_beams=None):
+        """
+        model:              VisionEncoderDecoderModel
+        image_processor:    ViT image processor (resize and normalisation settings)
+        tokenizer:          GPT-2 tokenizer used to decode generated ids
+        encoder_cache_size: frames whose encoder hidden states are kept (0 disables)
+        max_new_tokens:     default decode length (model generation config if None; its
+                            max_length counts the decoder start token, so one less)
+        num_beams:          default beam count (model generation config if None)
+        """
+        self.model = model.eval()
+        self.image_processor = image_processor
+        self.tokenizer = tokenizer
+        self.encoder_cache_size = max(0, int(encoder_cache_size))
+        self._pixel_settings = processor_settings(image_processor)
+
+        generation = model.generation_config
+        self.max_new_tokens = (max_new_tokens or generation.max_new_tokens
+                               or max(1, generation.max_length - DECODER_PROMPT_LENGTH))
+        self.num_beams = num_beams or generation.num_beams or 1
+
+        self._cache = OrderedDict()  # frame key -> encoder hidden states (1, seq, hidden)
+        self._lock = threading.Lock()
+        self.encoder_hits = 0
+        self.encoder_misses = 0
+
+    @classmethod
+    def from_pretrained(cls, model_name, **kwargs):
+        """Load the model, processor and tokenizer for a captioning checkpoint"""
+        from transformers import AutoTokenizer, ViTImageProcessor, VisionEncoderDecoderModel
+
+        return cls(
+            VisionEncoderDecoderModel.from_pretrained(model_name),
+            ViTImageProcessor.from_pretrained(model_name),
+            AutoTokenizer.from_pretrained(model_name),
+            **kwargs,
+        )
+
+    @staticmethod
+    def frame_key(image):
+        """Content key for a PIL image, for callers that have no better key"""
+        return hashlib.blake2b(image.tobytes(), digest_size=16).hexdigest()
+
+    def encode(self, images, keys=None):
+        """Return encoder hidden states for a batch, reusing cached frames"""
+        if keys is None:
+            keys = [None] * len(images)
+
+        states = [None] * len(images)
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key is not None and key in self._cache:
+                    self._cache.move_to_end(key)
+                    states[i] = self._cache[key]
+                    self.encoder_hits += 1
+
+        missing = [i for i, state in enumerate(states) if state is None]
+        if missing:
+            pixel_values = torch.from_numpy(
+                to_pixel_values([images[i] for i in missing], **self._pixel_settings))
+            with torch.no_grad():
+                hidden = self.model.encoder(
+                    pixel_values=pixel_values.to(self.model.device)).last_hidden_state
+
+            with self._lock:
+                self.encoder_misses += len(missing)
+                for row, i in enumerate(missing):
+                    states[i] = hidden[row:row + 1]
+                    if keys[i] is not None and self.encoder_cache_size:
+                        self._cache[keys[i]] = states[i]
+                        self._cache.move_to_end(keys[i])
+                while len(self._cache) > self.encoder_cache_size:
+                    self._cache.popitem(last=False)
+
+        return torch.cat(states, dim=0)
+
+    def decode(self, hidden_states, max_new_tokens=None, num_beams=None, greedy=False):
+        """Generate captions from encoder hidden states"""
+        num_beams = 1 if greedy else (num_beams or self.num_beams)
+        with torch.no_grad():
+            output_ids = self.model.generate(
+                encoder_outputs=BaseModelOutput(last_hidden_state=hidden_states),
+                max_new_tokens=max_new_tokens or self.max_new_tokens,
+                num_beams=num_beams,
+                do_sample=False,
+            )
+        return [text.strip() for text in self.tokenizer.batch_decode(output_ids, skip_special_tokens=True)]
+
+    def caption(self, images, keys=None, max_new_tokens=None, num_beams=None, greedy=False):
+        """Caption a batch of PIL images with per-call decoding settings"""
+        hidden_states = self.encode(images, keys)
+        return self.decode(hidden_states, max_new_tokens=max_new_tokens, num_beams=num_beams, greedy=greedy)
+
+    def __call__(self, images):
+        """Pipeline-compatible batch call: [[{'generated_text': ...}], ...]
+
+        Frames are keyed by content, so a repeated frame reuses its encoder states.
+        """
+        keys = [self.frame_key(image) for image in images] if self.encoder_cache_size else None
+        return [[{'generated_text': text}] for text in self.caption(images, keys)]
+
+    def stats(self):
+        """Encoder cache counters for monitoring"""
+        with self._lock:
+            return {
+                'encoder_cache_entries': len(self._cache),
+                'encoder_hits': self.encoder_hits,
+                'encoder_misses': self.encoder_misses,
+                'max_new_tokens': self.max_new_tokens,
+                'num_beams': self.num_beams,
+            }
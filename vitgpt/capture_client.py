@@ -0,0 +1,178 @@
+"""
+Pooled, hedged HTTP client for ESP32 /capture requests
+Reuses keep-alive connections, sends a second (hedged) request when the first
+one is slower than the recent latency percentile and takes whichever answer
+arrives first, and retries with exponential backoff plus jitter.
+"""
+
+import collections
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class CaptureError(Exception):
+    """Raised when every attempt to fetch a frame failed"""
+
+
+class LatencyTracker:
+    """Rolling window of successful request latencies"""
+
+    def __init__(self, window=100):
+        self._samples = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        """Latency at the given percentile in seconds, or None with no samples"""
+        with self._lock:
+            ordered = sorted(self._samples)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(pct / 100.0 * len(ordered)))]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._samples)
+
+
+class CaptureClient:
+    """Fetch frames over pooled keep-alive connections with hedging and retries"""
+
+    def __init__(self, connect_timeout=2.0, read_timeout=5.0, max_retries=3,
+                 hedge_percentile=95, min_hedge_delay=0.15, default_hedge_delay=1.0,
+                 min_samples=10, backoff_base=0.25, backoff_max=4.0, pool_size=4):
+        """
+        connect_timeout:     seconds to establish a connection
+        read_timeout:        seconds to wait for a stalled response
+        max_retries:         attempts (each possibly hedged) before giving up
+        hedge_percentile:    latency percentile after which a hedged request is sent
+        min_hedge_delay:     never hedge sooner than this many seconds
+        default_hedge_delay: hedge delay used until min_samples latencies are known
+        backoff_base:        first retry delay; doubles per attempt with full jitter
+        backoff_max:         upper bound for a single retry delay
+        pool_size:           keep-alive connections kept per host
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max(1, int(max_retries))
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.default_hedge_delay = default_hedge_delay
+        self.min_samples = min_samples
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # Two requests per attempt at most; stragglers finish in the background
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='capture')
+        self.latency = LatencyTracker()
+        self._stats_lock = threading.Lock()
+        self.requests_sent = 0
+        self.hedges_sent = 0
+        self.hedge_wins = 0
+        self.retries = 0
+        self.failures = 0
+
+    def hedge_delay(self):
+        """Seconds to wait on the first request before sending a hedged one"""
+        if len(self.latency) < self.min_samples:
+            return self.default_hedge_delay
+        return max(self.min_hedge_delay, self.latency.percentile(self.hedge_percentile))
+
+    def backoff(self, attempt):
+        """Full-jitter exponential backoff delay for a retry attempt (0-based)"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _fetch(self, url):
+        """Single GET; returns (body, seconds taken) for a 200 response or raises"""
+        with self._stats_lock:
+            self.requests_sent += 1
+        start = time.perf_counter()
+        response = self.session.get(url, timeout=self.timeout)
+        if response.status_code != 200:
+            raise CaptureError(f"HTTP Error: {response.status_code}")
+        return response.content, time.perf_counter() - start
+
+    def _hedged_fetch(self, url):
+        """Run one attempt, hedging it if the first request is slow"""
+        primary = self._executor.submit(self._fetch, url)
+        pending = {primary}
+        done, _ = wait(pending, timeout=self.hedge_delay())
+
+        if not done:
+            hedge = self._executor.submit(self._fetch, url)
+            pending.add(hedge)
+            with self._stats_lock:
+                self.hedges_sent += 1
+        else:
+            hedge = None
+
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    content, seconds = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                # Only winners count, so abandoned stragglers do not inflate the percentile
+                self.latency.record(seconds)
+                if future is hedge:
+                    with self._stats_lock:
+                        self.hedge_wins += 1
+                return content
+        raise error
+
+    def get(self, url):
+        """Fetch url, returning the response body or raising CaptureError"""
+        last_error = None
+        for attempt in range(self.max_retries):
+            if attempt:
+                with self._stats_lock:
+                    self.retries += 1
+                time.sleep(self.backoff(attempt - 1))
+            try:
+                return self._hedged_fetch(url)
+            except requests.exceptions.Timeout:
+                last_error = f"Timeout occurred (attempt {attempt + 1})"
+            except requests.exceptions.ConnectionError:
+                last_error = f"Connection error (attempt {attempt + 1})"
+            except Exception as e:
+                last_error = str(e)
+            print(last_error)
+
+        with self._stats_lock:
+            self.failures += 1
+        raise CaptureError(last_error)
+
+    def stats(self):
+        """Request, hedge and retry counters plus latency percentiles in milliseconds"""
+        p50, p95 = self.latency.percentile(50), self.latency.percentile(95)
+        with self._stats_lock:
+            return {
+                'requests_sent': self.requests_sent,
+                'hedges_sent': self.hedges_sent,
+                'hedge_wins': self.hedge_wins,
+                'retries': self.retries,
+                'failures': self.failures,
+                'latency_p50_ms': None if p50 is None else round(p50 * 1000.0, 1),
+                'latency_p95_ms': None if p95 is None else round(p95 * 1000.0, 1),
+                'hedge_delay_ms': round(self.hedge_delay() * 1000.0, 1),
+            }
+
+    def close(self):
+        """Drop pooled connections and background request threads"""
+        self._executor.shutdown(wait=False)
+        self.session.close()
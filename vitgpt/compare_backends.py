@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Backend Comparison Report
+Captions a folder of images with each inference backend and reports latency
+and caption agreement against the unmodified transformers
+pipeline("image-to-text"), which always runs first as the reference. The
+'pytorch' backend is the same eager model fed by the numpy preprocessing fast
+path, so it is compared against the reference like every other backend.
+No measured numbers are checked in; run this on the target hardware.
+
+Usage: python compare_backends.py --images ./frames [--backends pytorch quantized onnx] [--json report.json]
+"""
+
+import argparse
+import difflib
+import glob
+import json
+import os
+import statistics
+import time
+
+from PIL import Image
+
+from backends import BACKENDS, MODEL_NAME, load_backend
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png')
+REFERENCE = 'transformers'
+
+
+class TransformersPipeline:
+    """Reference: pipeline("image-to-text") with the HF image processor's own preprocessing"""
+
+    name = REFERENCE
+
+    def __init__(self, model_name=MODEL_NAME):
+        from transformers import pipeline
+
+        self.pipe = pipeline("image-to-text", model=model_name)
+
+    def __call__(self, images):
+        return self.pipe(images)
+
+
+def load_images(folder, limit=None):
+    """Load images from a folder as RGB PIL images"""
+    paths = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(folder, pattern)))
+    if limit:
+        paths = paths[:limit]
+    return [(os.path.basename(p), Image.open(p).convert('RGB')) for p in paths]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_backend(name, images, runs):
+    """Caption every image with one backend and time each call"""
+    print(f"\n⚙️  Loading {name} backend...")
+    start = time.perf_counter()
+    backend = TransformersPipeline() if name == REFERENCE else load_backend(name)
+    load_time = time.perf_counter() - start
+
+    # Warm-up so one-time initialisation does not count towards latency
+    backend([images[0][1]])
+
+    captions = {}
+    latencies = []
+    for filename, image in images:
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = backend([image])
+            latencies.append((time.perf_counter() - start) * 1000.0)
+        captions[filename] = result[0][0]['generated_text']
+        print(f"   {filename}: {captions[filename]}")
+
+    return {
+        'backend': name,
+        'load_time_s': round(load_time, 2),
+        'latency_ms': {
+            'mean': round(statistics.mean(latencies), 1),
+            'p50': round(percentile(latencies, 50), 1),
+            'p95': round(percentile(latencies, 95), 1),
+        },
+        'captions': captions,
+    }
+
+
+def agreement(reference, candidate):
+    """Exact-match rate and mean word-level similarity between two caption sets"""
+    exact = 0
+    similarity = []
+    for filename, ref_caption in reference.items():
+        caption = candidate.get(filename, '')
+        exact += caption == ref_caption
+        similarity.append(difflib.SequenceMatcher(None, ref_caption.split(), caption.split()).ratio())
+    return {
+        'exact_match': round(exact / len(reference), 3),
+        'word_similarity': round(statistics.mean(similarity), 3),
+    }
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Compare VIT-GPT inference backends')
+    parser.add_argument('--images', required=True, help='folder of test images')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('--runs', type=int, default=3, help='timed runs per image')
+    parser.add_argument('--limit', type=int, default=None, help='maximum number of images')
+    parser.add_argument('--json', help='write the report to this file')
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.limit)
+    if not images:
+        print(f"❌ No images found in {args.images}")
+        return
+
+    print("VIT-GPT Backend Comparison")
+    print("=" * 40)
+    print(f"Images: {len(images)}, runs per image: {args.runs}")
+
+    # The reference pipeline always runs so there is something to compare against
+    backends = [REFERENCE] + list(dict.fromkeys(args.backends))
+    results = [run_backend(name, images, args.runs) for name in backends]
+
+    reference = results[0]
+    for result in results:
+        result['agreement'] = agreement(reference['captions'], result['captions'])
+        result['speedup'] = round(reference['latency_ms']['mean'] / result['latency_ms']['mean'], 2)
+
+    print("\n📊 Comparison Report")
+    print("=" * 74)
+    print(f"{'Backend':<14}{'Load (s)':>10}{'Mean (ms)':>11}{'p50 (ms)':>10}{'p95 (ms)':>10}"
+          f"{'Speedup':>9}{'Exact':>8}{'Words':>8}")
+    for result in results:
+        latency = result['latency_ms']
+        print(f"{result['backend']:<14}{result['load_time_s']:>10}{latency['mean']:>11}{latency['p50']:>10}"
+              f"{latency['p95']:>10}{result['speedup']:>9}{result['agreement']['exact_match']:>8}"
+              f"{result['agreement']['word_similarity']:>8}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'images': len(images), 'runs': args.runs, 'results': results}, f, indent=2)
+        print(f"\n📝 Report saved to: {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+MJPEG stream frame source
+Keeps one long-lived connection to the ESP32-CAM /stream endpoint
+(multipart/x-mixed-replace), parses part boundaries incrementally and always
+hands out the newest complete JPEG, dropping frames nobody asked for.
+"""
+
+import re
+import threading
+import time
+
+import requests
+
+# Boundary used by CameraWebServer/app_httpd.cpp when the header does not say
+DEFAULT_BOUNDARY = b'123456789000000000000987654321'
+_CONTENT_LENGTH = re.compile(rb'content-length:\s*(\d+)', re.IGNORECASE)
+
+
+class MJPEGParser:
+    """Incremental multipart/x-mixed-replace parser yielding JPEG payloads"""
+
+    def __init__(self, boundary=DEFAULT_BOUNDARY, max_buffer=4 * 1024 * 1024):
+        if isinstance(boundary, str):
+            boundary = boundary.encode()
+        self.delimiter = b'--' + boundary.lstrip(b'-')
+        self.max_buffer = max_buffer
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        """Add received bytes and return every JPEG completed by them"""
+        self._buffer += data
+        frames = []
+
+        while True:
+            start = self._buffer.find(self.delimiter)
+            if start < 0:
+                # Keep only a tail long enough to hold a split delimiter
+                if len(self._buffer) > len(self.delimiter):
+                    del self._buffer[:-len(self.delimiter)]
+                break
+
+            header_end = self._buffer.find(b'\r\n\r\n', start)
+            if header_end < 0:
+                break
+            headers = bytes(self._buffer[start:header_end])
+            body_start = header_end + 4
+
+            match = _CONTENT_LENGTH.search(headers)
+            if match:
+                body_end = body_start + int(match.group(1))
+                if len(self._buffer) < body_end:
+                    break
+            else:
+                # No length header: the part runs until the next delimiter
+                body_end = self._buffer.find(self.delimiter, body_start)
+                if body_end < 0:
+                    break
+                while body_end > body_start and self._buffer[body_end - 1] in b'\r\n':
+                    body_end -= 1
+
+            frames.append(bytes(self._buffer[body_start:body_end]))
+            del self._buffer[:body_end]
+
+        if len(self._buffer) > self.max_buffer:
+            # Corrupt stream; resynchronise on the next delimiter
+            self._buffer.clear()
+        return frames
+
+
+class MJPEGStreamSource:
+    """Background reader that keeps the latest complete frame from an MJPEG stream"""
+
+    def __init__(self, url, connect_timeout=5, read_timeout=10, reconnect_delay=1.0, chunk_size=16384):
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.reconnect_delay = reconnect_delay
+        self.chunk_size = chunk_size
+
+        self._condition = threading.Condition()
+        self._latest = None
+        self._sequence = 0
+        self._delivered = 0
+        self._running = False
+        self._thread = None
+        self._response = None
+
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.reconnects = 0
+        self.connect_failures = 0  # consecutive failed connections since the last frame
+        self.last_error = None
+
+    def start(self):
+        """Start reading the stream in the background"""
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='mjpeg-reader', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Close the connection and stop the reader thread"""
+        self._running = False
+        response = self._response
+        if response is not None:
+            response.close()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def read_frame(self, timeout=None):
+        """Return the newest JPEG not handed out yet, waiting up to timeout seconds"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._running and self._sequence == self._delivered:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            if self._sequence == self._delivered:
+                return None
+            self._delivered = self._sequence
+            return self._latest
+
+    def stats(self):
+        """Stream counters for monitoring"""
+        return {
+            'frames_received': self.frames_received,
+            'frames_dropped': self.frames_dropped,
+            'reconnects': self.reconnects,
+            'connect_failures': self.connect_failures,
+            'last_error': self.last_error,
+        }
+
+    def _publish(self, frame):
+        """Replace the latest frame, counting the previous one as dropped if unread"""
+        with self._condition:
+            if self._sequence != self._delivered:
+                self.frames_dropped += 1
+            self._latest = frame
+            self._sequence += 1
+            self.frames_received += 1
+            self.connect_failures = 0
+            self._condition.notify_all()
+
+    def _iter_chunks(self, response):
+        """Yield bytes as soon as they arrive instead of waiting for full chunks"""
+        raw = response.raw
+        if hasattr(raw, 'read1'):
+            while True:
+                chunk = raw.read1(self.chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+        else:
+            # Older urllib3: chunked transfer encoding (as sent by the ESP32)
+            # is still delivered chunk by chunk as it arrives
+            yield from response.iter_content(chunk_size=None)
+
+    def _run(self):
+        """Reader loop: connect, parse parts as bytes arrive, reconnect on failure"""
+        while self._running:
+            frames_before = self.frames_received
+            try:
+                with requests.get(self.url, stream=True, timeout=self.timeout) as response:
+                    self._response = response
+                    response.raise_for_status()
+                    match = re.search(r'boundary="?([^";]+)"?', response.headers.get('content-type', ''))
+                    parser = MJPEGParser(match.group(1) if match else DEFAULT_BOUNDARY)
+
+                    for chunk in self._iter_chunks(response):
+                        if not self._running:
+                            break
+                        for frame in parser.feed(chunk):
+                            self._publish(frame)
+            except Exception as e:
+                if self._running:
+                    self.last_error = str(e)
+                    print(f"MJPEG stream error: {e}")
+            finally:
+                self._response = None
+
+            if self._running:
+                if self.frames_received == frames_before:
+                    self.connect_failures += 1
+                self.reconnects += 1
+                time.sleep(self.reconnect_delay)
@@ -0,0 +1,163 @@
+"""
+Threaded stage pipeline for the capture loop
+Capture, inference and speech run as separate stages joined by bounded
+drop-oldest queues, so the camera fetches the next frame while the model
+runs and the model keeps running while speech plays.
+"""
+
+import collections
+import statistics
+import threading
+import time
+
+
+class DropOldestQueue:
+    """Bounded queue that discards its oldest item instead of blocking producers"""
+
+    def __init__(self, maxsize=1):
+        self.maxsize = max(1, int(maxsize))
+        self._items = collections.deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        """Add an item, dropping the oldest one if the queue is full"""
+        with self._condition:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """Remove and return the oldest item, or None on timeout or close"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while not self._items and not self._closed:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            return self._items.popleft() if self._items else None
+
+    def close(self):
+        """Wake up all consumers; get() returns None once the queue is drained"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def __len__(self):
+        with self._condition:
+            return len(self._items)
+
+
+class StageTimer:
+    """Rolling record of how long a stage spends per item"""
+
+    def __init__(self, window=200):
+        self._durations = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, seconds):
+        with self._lock:
+            self._durations.append(seconds * 1000.0)
+            self.count += 1
+
+    def summary(self):
+        """Count, mean, p95 and last duration in milliseconds"""
+        with self._lock:
+            durations = list(self._durations)
+        if not durations:
+            return {'count': self.count, 'mean_ms': None, 'p95_ms': None, 'last_ms': None}
+        ordered = sorted(durations)
+        return {
+            'count': self.count,
+            'mean_ms': round(statistics.mean(durations), 1),
+            'p95_ms': round(ordered[int(0.95 * (len(ordered) - 1))], 1),
+            'last_ms': round(durations[-1], 1),
+        }
+
+
+class Stage(threading.Thread):
+    """Worker thread that applies a function to items from an inbox
+
+    Source stages (no inbox) call work() repeatedly with no arguments,
+    pausing interval seconds between calls. A result other than None is
+    passed on to every outbox.
+    """
+
+    def __init__(self, name, work, inbox=None, outboxes=(), stop_event=None, interval=0.0,
+                 poll_interval=0.5):
+        super().__init__(name=name, daemon=True)
+        self.work = work
+        self.inbox = inbox
+        self.outboxes = list(outboxes)
+        self.stop_event = stop_event or threading.Event()
+        self.interval = interval
+        self.poll_interval = poll_interval
+        self.timer = StageTimer()
+        self.errors = 0
+
+    def run(self):
+        while not self.stop_event.is_set():
+            if self.inbox is not None:
+                item = self.inbox.get(timeout=self.poll_interval)
+                if item is None:
+                    continue
+            elif self.interval and self.timer.count:
+                self.stop_event.wait(self.interval)
+
+            start = time.perf_counter()
+            try:
+                result = self.work() if self.inbox is None else self.work(item)
+            except Exception as e:
+                self.errors += 1
+                print(f"[{self.name}] stage error: {e}")
+                continue
+            self.timer.record(time.perf_counter() - start)
+
+            if result is not None:
+                for outbox in self.outboxes:
+                    outbox.put(result)
+
+
+class Pipeline:
+    """A set of stages sharing one stop signal"""
+
+    def __init__(self):
+        self.stop_event = threading.Event()
+        self.stages = []
+        self.queues = {}
+
+    def queue(self, name, maxsize=1):
+        """Create a named drop-oldest queue between stages"""
+        self.queues[name] = DropOldestQueue(maxsize)
+        return self.queues[name]
+
+    def stage(self, name, work, inbox=None, outboxes=(), interval=0.0):
+        """Add a stage running work() on its own thread"""
+        stage = Stage(name, work, inbox=inbox, outboxes=outboxes, stop_event=self.stop_event, interval=interval)
+        self.stages.append(stage)
+        return stage
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        return self
+
+    def stop(self, timeout=5):
+        """Signal every stage to stop and wait for them to finish their current item"""
+        self.stop_event.set()
+        for q in self.queues.values():
+            q.close()
+        for stage in self.stages:
+            stage.join(timeout=timeout)
+
+    def stats(self):
+        """Per-stage timings and per-queue drop counts"""
+        return {
+            'stages': {stage.name: dict(stage.timer.summary(), errors=stage.errors) for stage in self.stages},
+            'queues': {name: {'depth': len(q), 'dropped': q.dropped} for name, q in self.queues.items()},
+        }
@@ -0,0 +1,89 @@
+"""
+Image preprocessing fast path
+JPEGs are decoded straight to a reduced scale close to the model input size
+(libjpeg DCT scaling via PIL draft() or OpenCV IMREAD_REDUCED_*), and pixel
+tensors are normalised in place to keep copies of frame data to a minimum.
+"""
+
+import io
+
+import numpy as np
+from PIL import Image
+
+MODEL_INPUT_SIZE = 224
+# ViT image processor defaults for nlpconnect/vit-gpt2-image-captioning
+IMAGE_MEAN = (0.5, 0.5, 0.5)
+IMAGE_STD = (0.5, 0.5, 0.5)
+
+
+def decode_image(image_data, target_size=MODEL_INPUT_SIZE):
+    """Decode image bytes into an RGB PIL image no smaller than the target size"""
+    image = Image.open(io.BytesIO(image_data))
+    if image.format == 'JPEG' and min(image.size) >= 2 * target_size:
+        # Picks the largest 1/2, 1/4 or 1/8 DCT scale that still covers the target
+        image.draft('RGB', (target_size, target_size))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+
+def _reduction_factor(width, height, target_size):
+    """Largest JPEG scale-down factor (1, 2, 4 or 8) keeping both sides >= target"""
+    factor = 1
+    while factor < 8 and min(width, height) // (factor * 2) >= target_size:
+        factor *= 2
+    return factor
+
+
+def decode_frame(image_data, target_size=MODEL_INPUT_SIZE):
+    """Decode JPEG bytes into a BGR numpy frame at a reduced scale with OpenCV"""
+    import cv2
+
+    reduced_flags = {
+        1: cv2.IMREAD_COLOR,
+        2: cv2.IMREAD_REDUCED_COLOR_2,
+        4: cv2.IMREAD_REDUCED_COLOR_4,
+        8: cv2.IMREAD_REDUCED_COLOR_8,
+    }
+    try:
+        # Only the header is parsed here; pixel data is decoded once below
+        width, height = Image.open(io.BytesIO(image_data)).size
+        factor = _reduction_factor(width, height, target_size)
+    except Exception:
+        factor = 1
+    return cv2.imdecode(np.frombuffer(image_data, np.uint8), reduced_flags[factor])
+
+
+def frame_to_image(frame):
+    """Convert a BGR numpy frame into an RGB PIL image"""
+    import cv2
+
+    return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+
+def to_pixel_values(images, size=MODEL_INPUT_SIZE, mean=IMAGE_MEAN, std=IMAGE_STD):
+    """Resize and normalise PIL images into a float32 (batch, 3, size, size) array"""
+    batch = np.empty((len(images), 3, size, size), dtype=np.float32)
+    scale = np.array([1.0 / (255.0 * s) for s in std], dtype=np.float32)[:, None, None]
+    offset = np.array([m / s for m, s in zip(mean, std)], dtype=np.float32)[:, None, None]
+
+    for i, image in enumerate(images):
+        if image.size != (size, size):
+            image = image.resize((size, size), Image.BILINEAR)
+        # HWC uint8 -> CHW float32 written straight into the batch buffer
+        np.copyto(batch[i], np.asarray(image).transpose(2, 0, 1), casting='unsafe')
+        batch[i] *= scale
+        batch[i] -= offset
+    return batch
+
+
+def processor_settings(image_processor):
+    """Target size, mean and std used by a transformers image processor"""
+    size = image_processor.size
+    if isinstance(size, dict):
+        size = size.get('height') or size.get('shortest_edge') or MODEL_INPUT_SIZE
+    return {
+        'size': int(size),
+        'mean': tuple(image_processor.image_mean),
+        'std': tuple(image_processor.image_std),
+    }
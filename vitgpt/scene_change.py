@@ -0,0 +1,79 @@
+"""
+Cheap scene-change detection for the capture loop
+Compares a small grayscale copy of each frame against the last analyzed frame
+so the captioning model only runs when the view actually changes.
+"""
+
+import time
+import numpy as np
+
+
+class SceneChangeDetector:
+    """Decide whether a new frame differs enough from the last analyzed one"""
+
+    def __init__(self, threshold=0.04, max_staleness=10.0, method='diff', size=32):
+        """
+        threshold:     change score (0-1) above which a frame counts as a new scene;
+                       lower values make the detector more sensitive
+        max_staleness: seconds after which a frame is analyzed even without change
+        method:        'diff' for mean absolute pixel difference,
+                       'histogram' for grayscale histogram distance
+        size:          approximate side length of the downsampled copy
+        """
+        if method not in ('diff', 'histogram'):
+            raise ValueError(f"Unknown scene change method: {method}")
+        self.threshold = threshold
+        self.max_staleness = max_staleness
+        self.method = method
+        self.size = max(4, int(size))
+
+        self._reference = None
+        self._last_analyzed = 0.0
+        self.last_score = None
+        self.analyzed = 0
+        self.skipped = 0
+
+    def should_analyze(self, frame):
+        """Return True if the frame should be sent to the model"""
+        now = time.monotonic()
+        thumb = self._thumbnail(frame)
+
+        if self._reference is None or self._reference.shape != thumb.shape:
+            self.last_score = None
+            changed = True
+        else:
+            self.last_score = self._score(self._reference, thumb)
+            changed = self.last_score > self.threshold
+
+        stale = now - self._last_analyzed >= self.max_staleness
+        if changed or stale:
+            self._reference = thumb
+            self._last_analyzed = now
+            self.analyzed += 1
+            return True
+
+        self.skipped += 1
+        return False
+
+    def reset(self):
+        """Forget the reference frame so the next frame is always analyzed"""
+        self._reference = None
+
+    def _thumbnail(self, frame):
+        """Downsample by striding and collapse colour channels to grayscale"""
+        height, width = frame.shape[:2]
+        step = max(1, min(height, width) // self.size)
+        small = frame[::step, ::step]
+        if small.ndim == 3:
+            small = small.mean(axis=2)
+        return small.astype(np.float32)
+
+    def _score(self, previous, current):
+        """Change score between two thumbnails, normalised to 0-1"""
+        if self.method == 'histogram':
+            bins = np.linspace(0, 256, 33)
+            prev_hist, _ = np.histogram(previous, bins=bins)
+            curr_hist, _ = np.histogram(current, bins=bins)
+            total = float(previous.size)
+            return float(np.abs(prev_hist - curr_hist).sum() / (2.0 * total))
+        return float(np.abs(current - previous).mean() / 255.0)
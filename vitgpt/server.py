@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
 import cv2
 import time
@@ -6,17 +6,268 @@ import pyttsx3
 import requests
 import numpy as np
 from PIL import Image
-from transformers import pipeline
-import io
+import os
 import base64
+import json
+import argparse
+import multiprocessing
+import threading
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from backends import BACKENDS, MODEL_NAME, load_backend
+from admission import AdmissionController, AdmissionRejected, DeadlineExceeded, deadline_from_header
+from batching import BatchScheduler
+from caption_cache import CaptionCache, content_hash, dhash
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Registry, register_process_metrics
+from preprocess import MODEL_INPUT_SIZE, decode_image
+from speech_worker import PRIORITIES, SpeechUnavailable, SpeechWorker
+from audio_cache import AudioCache, wav_player
+from worker_pool import InferenceWorkerPool
+
+try:
+    import msgpack  # optional compact binary responses
+except ImportError:
+    msgpack = None
 
 app = Flask(__name__)
 CORS(app)
 
-# Load image captioning model
-print("Loading VIT-GPT model...")
-pipe = pipeline("image-to-text", model="nlpconnect/vit-gpt2-image-captioning")
-print("Model loaded successfully!")
+# Micro-batching settings (override with environment variables)
+BATCH_WINDOW_MS = float(os.environ.get('VITGPT_BATCH_WINDOW_MS', '10'))
+MAX_BATCH_SIZE = int(os.environ.get('VITGPT_MAX_BATCH_SIZE', '8'))
+MAX_BATCH_LATENCY_MS = float(os.environ.get('VITGPT_MAX_BATCH_LATENCY_MS', '0')) or None
+INFERENCE_TIMEOUT = float(os.environ.get('VITGPT_INFERENCE_TIMEOUT', '30'))
+
+# Worker pool settings (0 workers runs inference in this process)
+NUM_WORKERS = int(os.environ.get('VITGPT_WORKERS', '0'))
+THREADS_PER_WORKER = int(os.environ.get('VITGPT_THREADS_PER_WORKER',
+                                        str(max(1, (os.cpu_count() or 1) // max(1, NUM_WORKERS)))))
+
+# Encoder hidden states kept for per-request decoding (0 disables the cache)
+ENCODER_CACHE_SIZE = int(os.environ.get('VITGPT_ENCODER_CACHE_SIZE', '32'))
+MAX_NEW_TOKENS_LIMIT = 64
+NUM_BEAMS_LIMIT = 8
+
+# Caption cache settings (set VITGPT_CACHE_MAX_ENTRIES=0 to disable)
+CACHE_MAX_ENTRIES = int(os.environ.get('VITGPT_CACHE_MAX_ENTRIES', '256'))
+CACHE_MAX_DISTANCE = int(os.environ.get('VITGPT_CACHE_MAX_DISTANCE', '5'))
+CACHE_TTL = float(os.environ.get('VITGPT_CACHE_TTL', '30'))
+
+# Rendered speech audio kept in memory (pre-rendered phrases are never evicted)
+AUDIO_CACHE_MB = float(os.environ.get('VITGPT_AUDIO_CACHE_MB', '16'))
+
+# Exact results by BLAKE2 of the uploaded bytes, shared by every mode (0 disables)
+RESULT_STORE_SIZE = int(os.environ.get('VITGPT_RESULT_STORE_SIZE', '512'))
+RESULT_STORE_TTL = float(os.environ.get('VITGPT_RESULT_STORE_TTL', '300'))
+
+UNCLEAR_CAPTION = "Scene unclear or image processing failed"
+
+# Admission control: requests past admission at once, requests allowed to wait
+# for them, and the deadline used when a client sends no X-Deadline-Ms header
+MAX_ACTIVE_REQUESTS = int(os.environ.get('VITGPT_MAX_ACTIVE_REQUESTS',
+                                         str(MAX_BATCH_SIZE * max(1, NUM_WORKERS))))
+MAX_WAITING_REQUESTS = int(os.environ.get('VITGPT_MAX_WAITING_REQUESTS', str(2 * MAX_BATCH_SIZE)))
+DEFAULT_DEADLINE_MS = float(os.environ.get('VITGPT_DEFAULT_DEADLINE_MS', '0')) or None
+
+# Priority lanes, most urgent first: navigation (hazards) ahead of scene description.
+# A request waiting longer than STARVATION_MS is served next whatever its lane.
+LANES = ('navigation', 'scene_description')
+STARVATION_MS = float(os.environ.get('VITGPT_STARVATION_MS', '2000')) or None
+
+# Load the model and start speech when a WSGI server (flask run, gunicorn, waitress)
+# imports this module; set VITGPT_AUTOSTART=0 to call start_services() yourself
+AUTOSTART = os.environ.get('VITGPT_AUTOSTART', '1') != '0'
+
+# Per-request debug output (set VITGPT_VERBOSE=1 to print every step)
+VERBOSE = os.environ.get('VITGPT_VERBOSE', '0') == '1'
+
+# Raw-body upload types accepted by /analyze_image besides multipart forms
+RAW_IMAGE_TYPES = ('image/jpeg', 'image/png', 'application/octet-stream')
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+# Batch sizes used for warm-up inferences after the model loads
+WARMUP_BATCH_SIZES = [int(size) for size in os.environ.get(
+    'VITGPT_WARMUP_BATCH_SIZES', f'1,{MAX_BATCH_SIZE}').split(',') if size.strip()]
+
+def parse_backend_arg():
+    """Inference backend from --backend or VITGPT_BACKEND (default: pytorch)"""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--backend', choices=BACKENDS, default=os.environ.get('VITGPT_BACKEND', 'pytorch'))
+    args, _ = parser.parse_known_args()
+    return args.backend
+
+BACKEND = parse_backend_arg()
+
+def log_debug(message, *args):
+    """Print a per-request debug line when VITGPT_VERBOSE=1, formatting it only then"""
+    if VERBOSE:
+        print(message % args if args else message)
+
+class ServiceNotReady(Exception):
+    """Raised when a request needs the model before it has finished loading"""
+
+# Inference state, filled in by load_model() in the background so the
+# server can bind its port and answer /health and /ready straight away
+captioner = None
+engine = None
+worker_pool = None
+batcher = None
+model_ready = threading.Event()
+model_state = {
+    'status': 'not_started',
+    'error': None,
+    'load_time_s': None,
+    'warmup_time_s': None,
+    'warmup_batch_sizes': [],
+}
+
+def run_model_batch(images):
+    """Caption a list of images with a single batched call, through the engine's encoder cache if there is one"""
+    return (engine or captioner)(images)
+
+def warm_up(batch_sizes):
+    """Run dummy inferences at the served batch sizes so the first request is not cold"""
+    dummy = Image.new('RGB', (MODEL_INPUT_SIZE, MODEL_INPUT_SIZE), (127, 127, 127))
+    for size in batch_sizes:
+        images = [dummy] * size
+        if worker_pool:
+            # One batch per worker so every process gets warmed up
+            futures = [worker_pool.submit(images) for _ in range(worker_pool.size)]
+            for future in futures:
+                future.result()
+        else:
+            run_model_batch(images)
+
+def load_model():
+    """Load the backend, start inference workers and warm up the model"""
+    global captioner, engine, worker_pool, batcher
+    try:
+        model_state['status'] = 'loading'
+        print(f"Loading VIT-GPT model ({BACKEND} backend)...")
+        start = time.perf_counter()
+        captioner = load_backend(BACKEND, MODEL_NAME)
+        
+        # Split encoder/decoder engine: runs in-process batches with an encoder cache
+        # and serves requests that set their own decoding options
+        engine = captioner.make_engine(encoder_cache_size=ENCODER_CACHE_SIZE)
+        
+        # Optionally spawn worker processes that share the loaded weights
+        if NUM_WORKERS > 0:
+            try:
+                worker_pool = InferenceWorkerPool(
+                    captioner,
+                    model=captioner.model,
+                    num_workers=NUM_WORKERS,
+                    threads_per_worker=THREADS_PER_WORKER,
+                    result_timeout=INFERENCE_TIMEOUT,
+                )
+            except RuntimeError as e:
+                print(f"Worker pool unavailable, running inference in-process: {e}")
+        
+        # Requests arriving within the batch window share one forward pass
+        batcher = BatchScheduler(
+            worker_pool.caption_batch if worker_pool else run_model_batch,
+            max_batch_size=MAX_BATCH_SIZE,
+            batch_window_ms=BATCH_WINDOW_MS,
+            max_latency_ms=MAX_BATCH_LATENCY_MS,
+            max_inflight_batches=worker_pool.size if worker_pool else 1,
+        )
+        model_state['load_time_s'] = round(time.perf_counter() - start, 2)
+        print(f"Model loaded successfully in {model_state['load_time_s']}s!")
+        
+        model_state['status'] = 'warming_up'
+        start = time.perf_counter()
+        warm_up(WARMUP_BATCH_SIZES)
+        model_state['warmup_time_s'] = round(time.perf_counter() - start, 2)
+        model_state['warmup_batch_sizes'] = WARMUP_BATCH_SIZES
+        print(f"Warm-up finished in {model_state['warmup_time_s']}s (batch sizes {WARMUP_BATCH_SIZES})")
+        
+        model_state['status'] = 'ready'
+        model_ready.set()
+    except Exception as e:
+        model_state['status'] = 'failed'
+        model_state['error'] = str(e)
+        print(f"Model loading failed: {e}")
+        import traceback
+        traceback.print_exc()
+
+def start_model_loading():
+    """Load and warm up the model on a background thread"""
+    if model_state['status'] != 'not_started':
+        return
+    model_state['status'] = 'loading'
+    threading.Thread(target=load_model, name='model-loader', daemon=True).start()
+
+def readiness_status():
+    """Payload and HTTP status for the readiness endpoint"""
+    payload = dict(model_state, ready=model_ready.is_set(), backend=BACKEND, timestamp=time.time())
+    return payload, 200 if model_ready.is_set() else 503
+
+# Near-duplicate frames reuse the caption of an earlier frame
+caption_cache = CaptionCache(
+    max_entries=CACHE_MAX_ENTRIES,
+    max_distance=CACHE_MAX_DISTANCE,
+    ttl_seconds=CACHE_TTL,
+)
+
+# Bounded inference queue that keeps only the newest waiting frame per client
+admission = AdmissionController(
+    max_active=MAX_ACTIVE_REQUESTS,
+    max_waiting=MAX_WAITING_REQUESTS,
+    lanes=LANES,
+    starvation_ms=STARVATION_MS,
+)
+
+# Prometheus metrics served on /metrics
+metrics_registry = Registry()
+stage_seconds = metrics_registry.histogram(
+    'vitgpt_stage_seconds', 'Time spent in each /analyze_image stage.', ['stage'])
+request_seconds = metrics_registry.histogram(
+    'vitgpt_request_seconds', 'End-to-end /analyze_image latency by mode.', ['mode'])
+requests_total = metrics_registry.counter(
+    'vitgpt_requests_total', 'Analysis requests by mode and HTTP status.', ['mode', 'status'])
+errors_total = metrics_registry.counter(
+    'vitgpt_errors_total', 'Failed analysis requests by mode and reason.', ['mode', 'reason'])
+
+# Other queues a serving mode puts in front of inference: name -> callable returning its depth
+extra_queues = {}
+
+def queue_depths():
+    """Waiting requests per admission lane, images queued in the batcher and any extra queues"""
+    stats = admission.stats()
+    depths = {(f'admission_{lane}',): lane_stats['waiting'] for lane, lane_stats in stats['lanes'].items()}
+    depths[('batcher',)] = batcher.stats()['queued'] if batcher else 0
+    for name, depth in extra_queues.items():
+        depths[(name,)] = depth()
+    return depths
+
+metrics_registry.gauge('vitgpt_queue_depth', 'Requests waiting for inference by queue.', queue_depths, ['queue'])
+metrics_registry.gauge('vitgpt_inflight_inferences', 'Requests admitted past admission control and not yet finished.',
+                       lambda: admission.stats()['active'])
+metrics_registry.gauge('vitgpt_model_ready', 'Whether the model is loaded and serving.',
+                       lambda: int(model_ready.is_set()))
+register_process_metrics(metrics_registry)
+ERROR_REASONS = {400: 'bad_request', 429: 'superseded', 500: 'internal', 503: 'unavailable', 504: 'timeout'}
+
+def record_request(mode, status, seconds, reason=None):
+    """Count a finished analysis request and observe its latency"""
+    requests_total.inc(mode, str(status))
+    request_seconds.observe(seconds, mode)
+    if status >= 400:
+        errors_total.inc(mode, reason or ERROR_REASONS.get(status, str(status)))
+
+def metrics_mode(mode):
+    """Bounded mode label: a known mode, 'multi' for several, 'other' for anything else"""
+    modes = parse_modes(mode)
+    if len(modes) > 1:
+        return 'multi'
+    return modes[0] if modes[0] in LANES else 'other'
+
+# Exact-match store: the same JPEG bytes never reach the model twice, whatever the mode
+result_store = CaptionCache(
+    max_entries=RESULT_STORE_SIZE,
+    max_distance=0,
+    ttl_seconds=RESULT_STORE_TTL,
+)
 
 # Initialize text-to-speech engine
 def initialize_tts_engine():
@@ -41,151 +292,456 @@ def initialize_tts_engine():
         print(f"TTS initialization error: {e}")
         return None
 
-# Global TTS engine
-tts_engine = initialize_tts_engine()
+# Speech worker thread owns the TTS engine; /speak only queues jobs
+speech_worker = SpeechWorker(initialize_tts_engine, player=wav_player())
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    """Health check endpoint"""
-    return jsonify({
+# Fixed phrases spoken again and again, rendered to audio once at startup
+NAVIGATION_PHRASES = {
+    'door': 'There appears to be a door or entrance ahead. Move forward carefully.',
+    'stairs': 'Stairs detected. Proceed with caution and use handrails if available.',
+    'obstacle': 'Obstacle detected ahead. Consider changing direction or stopping.',
+    'path': 'Clear path detected. You can proceed forward safely.',
+    'people': 'People detected in the area. Be aware of your surroundings.',
+}
+CAUTION_PREFIX = 'Continue with caution. The area appears to be:'
+COMMON_PHRASES = list(NAVIGATION_PHRASES.values()) + ['Unable to analyze current image']
+SPEECH_PREFIXES = [CAUTION_PREFIX, 'Scene description:']
+
+audio_cache = AudioCache(
+    speech_worker.render,
+    max_bytes=int(AUDIO_CACHE_MB * 1024 * 1024),
+    prefixes=SPEECH_PREFIXES,
+)
+
+def prerender_common_phrases():
+    """Render the fixed phrases on the speech worker's background lane"""
+    start = time.time()
+    rendered = audio_cache.preload(COMMON_PHRASES)
+    print(f"Pre-rendered {rendered} speech phrases in {time.time() - start:.2f}s")
+
+def serving_process(debug):
+    """True in the process that serves requests
+
+    Spawned inference workers re-import this module, and with the debug reloader
+    on the watching parent never serves; only its child has WERKZEUG_RUN_MAIN set.
+    """
+    if multiprocessing.current_process().name != 'MainProcess':
+        return False
+    return not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+
+services_started = threading.Event()
+
+def start_services():
+    """Start the speech worker, pre-render common phrases and load the model (once)"""
+    if services_started.is_set():
+        return
+    services_started.set()
+    speech_worker.start()
+    if speech_worker.available:
+        threading.Thread(target=prerender_common_phrases, name='audio-prerender', daemon=True).start()
+    start_model_loading()
+
+def health_status():
+    """Payload for the health check endpoint"""
+    return {
         'status': 'healthy',
         'service': 'VIT-GPT AI Service',
-        'model': 'nlpconnect/vit-gpt2-image-captioning',
+        'model': MODEL_NAME,
+        'ready': model_ready.is_set(),
         'timestamp': time.time()
-    })
+    }
 
-@app.route('/info', methods=['GET'])
-def get_info():
-    """Get service information"""
-    return jsonify({
+def service_info():
+    """Payload for the service information endpoint"""
+    return {
         'service': 'VIT-GPT AI Service',
-        'model': 'nlpconnect/vit-gpt2-image-captioning',
+        'model': MODEL_NAME,
+        'backend': BACKEND,
         'version': '1.0.0',
         'capabilities': ['image_captioning', 'scene_description', 'navigation_guidance'],
-        'status': 'running'
-    })
+        'status': 'running' if model_ready.is_set() else model_state['status'],
+        'batching': batcher.stats() if batcher else None,
+        'cache': caption_cache.stats(),
+        'result_store': result_store.stats(),
+        'admission': admission.stats(),
+        'worker_pool': worker_pool.stats() if worker_pool else None,
+        'engine': engine.stats() if engine else None,
+        'speech': speech_worker.stats(),
+        'audio_cache': audio_cache.stats()
+    }
+
+def load_image(image_data):
+    """Decode uploaded image bytes into an RGB PIL image close to the model input size"""
+    image = decode_image(image_data, MODEL_INPUT_SIZE)
+    image.load()  # decode pixels now rather than lazily inside the model call
+    log_debug("Image decoded: %s, mode: %s", image.size, image.mode)
+    return image
+
+def caption_image(image, deadline=None, lane=None, use_cache=True):
+    """Caption a PIL image, reusing the caption of a near-identical recent frame unless use_cache is False
+
+    Returns (caption, cached), cached being True for a caption cache hit.
+    """
+    image_hash = dhash(image)
+    result = caption_cache.lookup(image_hash) if use_cache else None
+    cached = result is not None
+    if cached:
+        log_debug("Caption cache hit: %s", result)
+    else:
+        # Get caption from VIT-GPT model (batched with concurrent requests)
+        result = batcher.caption(image, timeout=INFERENCE_TIMEOUT, deadline=deadline,
+                                 priority=lane_priority(lane))
+        log_debug("Model result: %s", result)
+        if result and len(result) > 0 and 'generated_text' in result[0]:
+            caption_cache.store(image_hash, result)
+    
+    if result and len(result) > 0 and 'generated_text' in result[0]:
+        caption = result[0]['generated_text']
+        log_debug("Generated caption: %s", caption)
+    else:
+        caption = UNCLEAR_CAPTION
+        log_debug("No caption generated")
+    
+    return caption, cached
+
+def parse_decoding_options(params):
+    """Per-request decoding settings from form/query fields, or None for the defaults"""
+    options = {}
+    if params.get('max_new_tokens'):
+        options['max_new_tokens'] = min(MAX_NEW_TOKENS_LIMIT, max(1, int(params['max_new_tokens'])))
+    if params.get('num_beams'):
+        options['num_beams'] = min(NUM_BEAMS_LIMIT, max(1, int(params['num_beams'])))
+    decoding = params.get('decoding')
+    if decoding:
+        if decoding not in ('greedy', 'beam'):
+            raise ValueError(f"Unknown decoding '{decoding}', expected 'greedy' or 'beam'")
+        options['greedy'] = decoding == 'greedy'
+    if options and model_ready.is_set() and engine is None:
+        raise ValueError(f"per-request decoding is not supported by the {BACKEND} backend")
+    return options or None
+
+def caption_with_engine(image, decoding, deadline=None, use_cache=True):
+    """Caption with per-request decoding, reusing cached encoder states for the same frame"""
+    if deadline is not None and deadline <= time.monotonic():
+        raise DeadlineExceeded('Deadline passed before inference')
+    # Same key as default-decoding batches, so either kind reuses the other's encoder states
+    keys = [engine.frame_key(image)] if use_cache else None
+    caption = engine.caption([image], keys=keys, **decoding)[0]
+    log_debug("Generated caption (%s): %s", decoding, caption)
+    return caption or UNCLEAR_CAPTION
+
+def build_analysis_response(caption, mode):
+    """Build the /analyze_image response payload for a caption and mode"""
+    if mode == 'scene_description':
+        return {
+            'description': caption,
+            'mode': 'scene_description',
+            'confidence': 0.8,
+            'timestamp': time.time()
+        }
+    elif mode == 'navigation':
+        navigation = generate_navigation_guidance(caption)
+        return {
+            'navigation': navigation,
+            'description': caption,
+            'mode': 'navigation',
+            'confidence': 0.8,
+            'timestamp': time.time()
+        }
+    else:
+        return {
+            'description': caption,
+            'mode': 'unknown',
+            'confidence': 0.8,
+            'timestamp': time.time()
+        }
+
+def parse_modes(mode):
+    """Requested modes from a single mode or a comma-separated list, without duplicates"""
+    modes = []
+    for name in (mode or 'scene_description').split(','):
+        name = name.strip()
+        if name and name not in modes:
+            modes.append(name)
+    return modes or ['scene_description']
+
+def request_lane(modes):
+    """Scheduling lane for a request: navigation if any requested mode needs it"""
+    return 'navigation' if 'navigation' in modes else 'scene_description'
+
+def lane_priority(lane):
+    """Batch priority for a lane (lower runs first)"""
+    return LANES.index(lane) if lane in LANES else len(LANES)
+
+def build_multi_response(caption, modes):
+    """Response payload for one or more modes computed from the same caption"""
+    if len(modes) == 1:
+        return build_analysis_response(caption, modes[0])
+    return {
+        'description': caption,
+        'modes': modes,
+        'results': {mode: build_analysis_response(caption, mode) for mode in modes},
+        'confidence': 0.8,
+        'timestamp': time.time()
+    }
+
+def analyze_image_data(image_data, mode, decoding=None, client_id=None, deadline=None, use_cache=True):
+    """Decode, caption and format uploaded image bytes for one or more comma-separated modes
+
+    client_id and deadline (a time.monotonic() value) feed admission control;
+    AdmissionRejected is raised if the request is turned away before inference.
+    use_cache=False skips every stored result and always runs the model.
+    """
+    modes, key, response_data = begin_analysis(image_data, mode, decoding, use_cache)
+    if response_data is not None:
+        return response_data
+    lane = request_lane(modes)
+    waiting_since = time.perf_counter()
+    with admission.slot(client_id, deadline, lane):
+        stage_seconds.observe(time.perf_counter() - waiting_since, 'admission')
+        return run_analysis(image_data, modes, key, decoding, deadline, lane, use_cache)
+
+def begin_analysis(image_data, mode, decoding=None, use_cache=True):
+    """Requested modes, result store key and the stored response if this frame was seen before
+
+    Raises ServiceNotReady until the model is loaded.
+    """
+    if not model_ready.is_set():
+        raise ServiceNotReady(f"Model is {model_state['status']}")
+    log_debug("Image data size: %d bytes", len(image_data))
+    modes = parse_modes(mode)
+
+    with stage_seconds.time('result_store'):
+        key = content_hash(image_data, sorted((decoding or {}).items()))
+        caption = result_store.lookup(key) if use_cache else None
+    response_data = finish_analysis(caption, modes, cached=True) if caption is not None else None
+    return modes, key, response_data
+
+def run_analysis(image_data, modes, key, decoding, deadline, lane, use_cache=True):
+    """Decode and caption a frame that holds an admission slot, then store and format the result"""
+    with stage_seconds.time('decode'):
+        image = load_image(image_data)
+    log_debug("Analyzing image in %s mode: %s", modes, image.size)
+
+    with stage_seconds.time('inference'):
+        if decoding and engine:
+            caption, cached = caption_with_engine(image, decoding, deadline, use_cache), False
+        else:
+            caption, cached = caption_image(image, deadline, lane, use_cache)
+    if caption != UNCLEAR_CAPTION:
+        result_store.store(key, caption)
+    return finish_analysis(caption, modes, cached)
+
+def finish_analysis(caption, modes, cached):
+    """Response payload for a caption in every requested mode"""
+    with stage_seconds.time('postprocess'):
+        response_data = build_multi_response(caption, modes)
+    response_data['cached'] = cached
+    log_debug("Returning %s: %s", modes, response_data)
+    return response_data
+
+def request_mode(params, headers):
+    """Analysis mode(s) from the modes/mode field or query parameter, or the X-Analysis-Mode header
+
+    Several modes can be given as a comma-separated list, e.g. modes=scene_description,navigation.
+    """
+    return params.get('modes') or params.get('mode') or headers.get('X-Analysis-Mode') or 'scene_description'
+
+def request_admission(headers, remote_addr):
+    """Client id and monotonic deadline for a request; raises ValueError on a bad deadline
+
+    Clients name themselves with X-Client-Id (default: their address) and pass
+    the milliseconds they are still willing to wait in X-Deadline-Ms.
+    """
+    client_id = headers.get('X-Client-Id') or remote_addr
+    deadline = deadline_from_header(headers.get('X-Deadline-Ms') or DEFAULT_DEADLINE_MS)
+    return client_id, deadline
+
+def allows_cached(headers):
+    """False if the client sent Cache-Control: no-cache and wants the model run on this frame"""
+    return 'no-cache' not in headers.get('Cache-Control', '').lower()
+
+def rejection_response(error):
+    """Payload, status and headers for a request turned away by admission control"""
+    payload = {'error': f'Request not processed: {str(error)}', 'reason': type(error).__name__}
+    return payload, error.status_code, {'Retry-After': str(error.retry_after)}
+
+def wants_msgpack(accept, params):
+    """True if the client asked for msgpack (Accept header or ?format=msgpack) and it is installed"""
+    if msgpack is None:
+        return False
+    return params.get('format') == 'msgpack' or any(t in (accept or '') for t in MSGPACK_TYPES)
+
+def encode_payload(payload, use_msgpack):
+    """Serialise a response payload as msgpack or compact JSON; returns (body, content type)"""
+    if use_msgpack:
+        return msgpack.packb(payload, use_bin_type=True), 'application/msgpack'
+    return json.dumps(payload, separators=(',', ':')), 'application/json'
+
+def parse_speech_request(data):
+    """Text, priority, interrupt and return_audio flags from a /speak JSON body; raises ValueError"""
+    text = (data or {}).get('text', '')
+    if not text:
+        raise ValueError('No text provided')
+    priority = data.get('priority', 'description')
+    if priority not in PRIORITIES:
+        raise ValueError(f"priority must be one of {', '.join(PRIORITIES)}")
+    interrupt = data.get('interrupt')
+    if interrupt is not None and not isinstance(interrupt, bool):
+        raise ValueError('interrupt must be true or false')
+    return_audio = data.get('return_audio', False)
+    if not isinstance(return_audio, bool):
+        raise ValueError('return_audio must be true or false')
+    return text, priority, interrupt, return_audio
+
+def queue_speech(text, priority, interrupt):
+    """Queue text on the speech worker, with cached audio if there is any, and return the job payload"""
+    # Without a player cached audio cannot be used, so do not count it as a hit
+    audio, remainder = audio_cache.lookup(text) if speech_worker.player is not None else (None, None)
+    job = speech_worker.submit(text, priority=priority, interrupt=interrupt, audio=audio, remainder=remainder)
+    job['status_url'] = f"/speak/{job['job_id']}"
+    return job
+
+def speech_audio(text, priority):
+    """WAV bytes for text from the audio cache, rendering at the request's priority on a miss"""
+    audio, hit = audio_cache.get(text, rank=PRIORITIES[priority])
+    return audio, {'Content-Type': 'audio/wav', 'X-Audio-Cache': 'hit' if hit else 'miss'}
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Health check endpoint"""
+    return jsonify(health_status())
+
+@app.route('/ready', methods=['GET'])
+def ready_check():
+    """Readiness endpoint: 200 once the model is loaded and warmed up"""
+    payload, status = readiness_status()
+    return jsonify(payload), status
+
+@app.route('/info', methods=['GET'])
+def get_info():
+    """Get service information"""
+    return jsonify(service_info())
+
+def analysis_response(payload, status=200, headers=None):
+    """Flask response for /analyze_image in the encoding the client asked for, recording its metrics"""
+    with stage_seconds.time('encode'):
+        body, content_type = encode_payload(payload, wants_msgpack(request.headers.get('Accept'), request.args))
+    record_request(g.get('analysis_mode', 'other'), status, time.perf_counter() - g.analysis_start,
+                   payload.get('reason'))
+    return app.response_class(body, status=status, headers=headers, content_type=content_type)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics in the text exposition format"""
+    return app.response_class(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
 
 @app.route('/analyze_image', methods=['POST'])
 def analyze_image():
-    """Analyze uploaded image and return description based on mode"""
+    """Analyze an uploaded image (multipart form or raw image body) and return description based on mode"""
+    g.analysis_start = time.perf_counter()
     try:
-        print(f"Received request with {len(request.files)} files")
-        
-        if 'image' not in request.files:
-            print("No image file in request")
-            return jsonify({'error': 'No image file provided'}), 400
-        
-        file = request.files['image']
-        if file.filename == '':
-            print("Empty filename")
-            return jsonify({'error': 'No image file selected'}), 400
-        
-        # Get mode parameter
-        mode = request.form.get('mode', 'scene_description')
-        print(f"Processing mode: {mode}")
-        
-        # Read image data
-        image_data = file.read()
-        print(f"Image data size: {len(image_data)} bytes")
-        
-        # Convert to PIL Image
-        image = Image.open(io.BytesIO(image_data))
-        print(f"Image opened: {image.size}, mode: {image.mode}")
-        
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-            print(f"Converted to RGB: {image.size}")
-        
-        print(f"Analyzing image in {mode} mode: {image.size}")
-        
-        # Get caption from VIT-GPT model
-        result = pipe(image)
-        print(f"Model result: {result}")
-        
-        caption = None
-        if result and len(result) > 0 and 'generated_text' in result[0]:
-            caption = result[0]['generated_text']
-            print(f"Generated caption: {caption}")
-        else:
-            caption = "Scene unclear or image processing failed"
-            print("No caption generated")
-        
-        # Process based on mode
-        if mode == 'scene_description':
-            response_data = {
-                'description': caption,
-                'mode': 'scene_description',
-                'confidence': 0.8,
-                'timestamp': time.time()
-            }
-            print(f"Returning scene description: {response_data}")
-            return jsonify(response_data)
-        elif mode == 'navigation':
-            navigation = generate_navigation_guidance(caption)
-            response_data = {
-                'navigation': navigation,
-                'description': caption,
-                'mode': 'navigation',
-                'confidence': 0.8,
-                'timestamp': time.time()
-            }
-            print(f"Returning navigation: {response_data}")
-            return jsonify(response_data)
+        # Taken before the body is read so the deadline covers upload time too
+        try:
+            client_id, deadline = request_admission(request.headers, request.remote_addr)
+        except ValueError as e:
+            return analysis_response({'error': f'Invalid X-Deadline-Ms: {str(e)}'}, 400)
+
+        upload_start = time.perf_counter()
+        if request.mimetype in RAW_IMAGE_TYPES:
+            # Raw body: no form parsing or spooling, mode and options come from the query string
+            params = request.args
+            image_data = request.get_data(cache=False)
+            if not image_data:
+                return analysis_response({'error': 'No image data provided'}, 400)
         else:
-            response_data = {
-                'description': caption,
-                'mode': 'unknown',
-                'confidence': 0.8,
-                'timestamp': time.time()
-            }
-            print(f"Returning unknown mode: {response_data}")
-            return jsonify(response_data)
+            if 'image' not in request.files:
+                log_debug("No image file in request")
+                return analysis_response({'error': 'No image file provided'}, 400)
+
+            file = request.files['image']
+            if file.filename == '':
+                log_debug("Empty filename")
+                return analysis_response({'error': 'No image file selected'}, 400)
+            params = request.form
+            image_data = file.read()
+        stage_seconds.observe(time.perf_counter() - upload_start, 'upload')
+
+        mode = request_mode(params, request.headers)
+        g.analysis_mode = metrics_mode(mode)
+        log_debug("Processing mode: %s", mode)
+
+        # Optional decoding settings (max_new_tokens, num_beams, decoding=greedy|beam)
+        try:
+            decoding = parse_decoding_options(params)
+        except ValueError as e:
+            return analysis_response({'error': f'Invalid decoding options: {str(e)}'}, 400)
+
+        return analysis_response(analyze_image_data(image_data, mode, decoding, client_id, deadline,
+                                                    allows_cached(request.headers)))
         
+    except AdmissionRejected as e:
+        return analysis_response(*rejection_response(e))
+    except ServiceNotReady as e:
+        return analysis_response({'error': f'Service not ready: {str(e)}'}, 503, {'Retry-After': '5'})
+    except FuturesTimeoutError:
+        # The batch scheduler gave up waiting for the model
+        print(f"Image analysis timed out after {INFERENCE_TIMEOUT}s")
+        return analysis_response({'error': 'Failed to analyze image: timed out'}, 504)
     except Exception as e:
         print(f"Error analyzing image: {e}")
         import traceback
         traceback.print_exc()
-        return jsonify({'error': f'Failed to analyze image: {str(e)}'}), 500
+        return analysis_response({'error': f'Failed to analyze image: {str(e)}'}, 500)
 
 def generate_navigation_guidance(description):
     """Generate navigation guidance from scene description"""
     lower_desc = description.lower()
     
     if 'door' in lower_desc or 'entrance' in lower_desc:
-        return 'There appears to be a door or entrance ahead. Move forward carefully.'
+        return NAVIGATION_PHRASES['door']
     elif 'stairs' in lower_desc or 'step' in lower_desc:
-        return 'Stairs detected. Proceed with caution and use handrails if available.'
+        return NAVIGATION_PHRASES['stairs']
     elif 'wall' in lower_desc or 'obstacle' in lower_desc:
-        return 'Obstacle detected ahead. Consider changing direction or stopping.'
+        return NAVIGATION_PHRASES['obstacle']
     elif 'path' in lower_desc or 'walkway' in lower_desc:
-        return 'Clear path detected. You can proceed forward safely.'
+        return NAVIGATION_PHRASES['path']
     elif 'person' in lower_desc or 'people' in lower_desc:
-        return 'People detected in the area. Be aware of your surroundings.'
+        return NAVIGATION_PHRASES['people']
     else:
-        return f'Continue with caution. The area appears to be: {description}'
+        return f'{CAUTION_PREFIX} {description}'
 
 @app.route('/speak', methods=['POST'])
 def speak_text():
-    """Convert text to speech"""
+    """Queue text for speech and return a job id straight away, or return its audio"""
     try:
-        data = request.get_json()
-        text = data.get('text', '')
-        
-        if not text:
-            return jsonify({'error': 'No text provided'}), 400
-        
-        if tts_engine:
-            tts_engine.say(text)
-            tts_engine.runAndWait()
-            return jsonify({'status': 'success', 'message': 'Text spoken successfully'})
-        else:
-            return jsonify({'error': 'TTS engine not available'}), 500
-            
+        text, priority, interrupt, return_audio = parse_speech_request(request.get_json(silent=True))
+        if return_audio:
+            audio, headers = speech_audio(text, priority)
+            return audio, 200, headers
+        return jsonify(queue_speech(text, priority, interrupt)), 202
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except SpeechUnavailable as e:
+        return jsonify({'error': str(e)}), 500
+    except TimeoutError as e:
+        return jsonify({'error': str(e)}), 504
     except Exception as e:
         print(f"TTS error: {e}")
         return jsonify({'error': f'TTS failed: {str(e)}'}), 500
 
+@app.route('/speak/<job_id>', methods=['GET'])
+def speech_status(job_id):
+    """Status of a queued speech job"""
+    job = speech_worker.status(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown speech job'}), 404
+    return jsonify(job)
+
+# Nothing runs __main__ under a WSGI server, so start here; python server.py starts below
+if AUTOSTART and __name__ != '__main__' and serving_process(app.debug):
+    start_services()
+
 if __name__ == '__main__':
     print("Starting VIT-GPT AI Service...")
     print("Make sure to install required packages:")
@@ -193,4 +749,11 @@ if __name__ == '__main__':
     print("Service will be available at: http://localhost:5000")
     print("Health check: http://localhost:5000/health")
     print("Service info: http://localhost:5000/info")
+    print("Metrics: http://localhost:5000/metrics")
+    print("Readiness: http://localhost:5000/ready")
+    print(f"Inference backend: {BACKEND} (choose with --backend {{{','.join(BACKENDS)}}})")
+    print("For production serving run: python asgi.py")
+    # With the reloader on, only the serving child process loads the model
+    if serving_process(debug=True):
+        start_services()
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,358 @@
+"""
+Dedicated text-to-speech worker
+One thread owns the pyttsx3 engine and speaks jobs from a priority queue, so
+HTTP handlers return immediately and concurrent requests never share the
+engine. Urgent jobs (navigation hazards) jump the queue and can cut off a
+lower-priority utterance that is already playing. The same thread renders
+text to WAV for the audio cache. A driver failure replaces the engine with a
+fresh one, and time to first audio is measured for every utterance.
+"""
+
+import collections
+import heapq
+import itertools
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Lower value is spoken first
+PRIORITIES = {
+    'hazard': 0,
+    'navigation': 1,
+    'description': 2,
+}
+DEFAULT_PRIORITY = 'description'
+# Rank for pre-rendering audio, so it never delays anything that will be heard
+BACKGROUND_RANK = len(PRIORITIES)
+# Seconds between interrupt checks while cached audio plays
+PLAYBACK_POLL = 0.05
+
+
+class SpeechUnavailable(Exception):
+    """Raised when no TTS engine could be initialised"""
+
+
+class SpeechWorker:
+    """Background thread speaking queued jobs in priority order"""
+
+    def __init__(self, engine_factory, max_jobs=256, init_timeout=10.0, player=None,
+                 restart_delay=0.5, max_restart_delay=30.0):
+        """
+        engine_factory: callable returning a configured pyttsx3 engine (or None on failure);
+                        called on the worker thread, which then owns the engine
+        max_jobs:       finished jobs kept for status lookups
+        init_timeout:   seconds start() waits for the engine to initialise
+        player:         callable starting playback of WAV bytes and returning a handle with
+                        wait(timeout) and stop(); jobs submitted with pre-rendered audio
+                        use it instead of the engine
+        restart_delay:  first wait before re-creating a failed engine; doubles per failed attempt
+        max_restart_delay: upper bound for that wait
+        """
+        self.engine_factory = engine_factory
+        self.player = player
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.max_jobs = max_jobs
+        self.init_timeout = init_timeout
+
+        self._queue = []  # (priority, sequence, job id)
+        self._sequence = itertools.count()
+        self._jobs = OrderedDict()  # job id -> job dict, oldest first
+        self._finished = {}  # job id -> Event set when the job stops speaking
+        self._audio = {}  # job id -> pre-rendered WAV for queued jobs
+        self._renders = {}  # render id -> {'text', 'done', 'audio', 'error'}
+        self._condition = threading.Condition()
+        self._current = None
+        self._interrupt = False
+        self._stopped = False
+        self._speak_started = 0.0
+        self._ready = threading.Event()
+        self._thread = None
+        self._running = False
+
+        self.engine = None
+        self.available = False  # an engine started; jobs are accepted while a failed one restarts
+        self.spoken = 0
+        self.interrupted = 0
+        self.failed = 0
+        self.restarts = 0
+        self._first_audio_ms = collections.deque(maxlen=100)
+
+    def start(self):
+        """Start the worker and wait for the engine to initialise"""
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name='speech-worker', daemon=True)
+            self._thread.start()
+            self._ready.wait(self.init_timeout)
+        return self
+
+    def stop(self):
+        """Finish the current utterance and stop the worker"""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def submit(self, text, priority=DEFAULT_PRIORITY, interrupt=None, audio=None, remainder=None):
+        """Queue text and return its job dict
+
+        priority:  'hazard', 'navigation' or 'description'
+        interrupt: cut off a lower-priority utterance that is playing
+                   (default: only for hazards)
+        audio:     pre-rendered WAV for text, played instead of synthesising if possible
+        remainder: with audio, the part of text the audio does not cover (a cached
+                   prefix), synthesised straight after it
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority must be one of {', '.join(PRIORITIES)}")
+        if not self.available:
+            raise SpeechUnavailable('TTS engine not available')
+        if interrupt is None:
+            interrupt = priority == 'hazard'
+
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'text': text,
+            'priority': priority,
+            'status': 'queued',
+            'submitted_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'time_to_first_audio_ms': None,
+            'error': None,
+        }
+        rank = PRIORITIES[priority]
+        with self._condition:
+            self._jobs[job['job_id']] = job
+            self._finished[job['job_id']] = threading.Event()
+            if audio is not None:
+                self._audio[job['job_id']] = (audio, remainder)
+            self._trim_jobs()
+            heapq.heappush(self._queue, (rank, next(self._sequence), job['job_id']))
+            current = self._current
+            if interrupt and current is not None and PRIORITIES[current['priority']] > rank:
+                self._interrupt = True
+            self._condition.notify()
+            return dict(job)
+
+    def speak(self, text, priority=DEFAULT_PRIORITY, interrupt=None, timeout=None, audio=None, remainder=None):
+        """Queue text and wait until it has been spoken; returns the final job dict"""
+        job = self.submit(text, priority=priority, interrupt=interrupt, audio=audio, remainder=remainder)
+        with self._condition:
+            finished = self._finished.get(job['job_id'])
+        if finished is not None:
+            finished.wait(timeout)
+        return self.status(job['job_id'])
+
+    def render(self, text, rank=BACKGROUND_RANK, timeout=30.0):
+        """Render text to WAV bytes on the worker thread and wait for the result"""
+        if not self.available:
+            raise SpeechUnavailable('TTS engine not available')
+        render_id = uuid.uuid4().hex
+        request = {'text': text, 'done': threading.Event(), 'audio': None, 'error': None}
+        with self._condition:
+            self._renders[render_id] = request
+            heapq.heappush(self._queue, (rank, next(self._sequence), render_id))
+            self._condition.notify()
+
+        if not request['done'].wait(timeout):
+            with self._condition:
+                self._renders.pop(render_id, None)
+            raise TimeoutError(f'Rendering speech timed out after {timeout}s')
+        if request['error']:
+            raise RuntimeError(request['error'])
+        return request['audio']
+
+    def status(self, job_id):
+        """Job dict for job_id, with its queue position while queued, or None"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+            if job['status'] == 'queued':
+                order = [entry for entry in sorted(self._queue) if entry[2] not in self._renders]
+                job['queue_position'] = next(
+                    (i for i, (_, _, queued_id) in enumerate(order) if queued_id == job_id), None)
+            return job
+
+    def stats(self):
+        """Queue depth, outcome counters and time to first audio for monitoring"""
+        with self._condition:
+            first_audio = sorted(self._first_audio_ms)
+            return {
+                'available': self.available,
+                'queued': len(self._queue) - len(self._renders),
+                'speaking': self._current['job_id'] if self._current else None,
+                'spoken': self.spoken,
+                'interrupted': self.interrupted,
+                'failed': self.failed,
+                'restarts': self.restarts,
+                'time_to_first_audio_mean_ms':
+                    round(sum(first_audio) / len(first_audio), 1) if first_audio else None,
+                'time_to_first_audio_p95_ms':
+                    round(first_audio[int(0.95 * (len(first_audio) - 1))], 1) if first_audio else None,
+            }
+
+    def _trim_jobs(self):
+        """Forget the oldest finished jobs beyond max_jobs"""
+        excess = len(self._jobs) - self.max_jobs
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id]['status'] not in ('queued', 'speaking'):
+                del self._jobs[job_id]
+                self._finished.pop(job_id, None)
+                excess -= 1
+
+    def _mark_first_audio(self):
+        """Record time to first audio for the job being spoken"""
+        job = self._current
+        if job is not None and job['time_to_first_audio_ms'] is None:
+            elapsed = (time.perf_counter() - self._speak_started) * 1000.0
+            job['time_to_first_audio_ms'] = round(elapsed, 1)
+            self._first_audio_ms.append(elapsed)
+
+    def _on_utterance(self, name):
+        """Engine callback when audio output starts"""
+        self._mark_first_audio()
+
+    def _on_word(self, name, location, length):
+        """Engine callback between words: stop the utterance if a preempting job arrived"""
+        self._mark_first_audio()
+        if self._interrupt and not self._stopped:
+            self._stopped = True
+            self.engine.stop()
+
+    def _play(self, audio):
+        """Play cached audio, stopping it if a preempting job arrives"""
+        playback = self.player(audio)
+        while not playback.wait(PLAYBACK_POLL):
+            if self._interrupt and not self._stopped:
+                self._stopped = True
+                playback.stop()
+                return
+
+    def _render_to_wav(self, text):
+        """Synthesise text into a temporary WAV file and return its bytes"""
+        fd, path = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+        try:
+            self.engine.save_to_file(text, path)
+            self.engine.runAndWait()
+            with open(path, 'rb') as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+    def _finish_render(self, request):
+        """Fulfil a render request on the worker thread; returns False if the engine failed"""
+        try:
+            request['audio'] = self._render_to_wav(request['text'])
+        except Exception as e:
+            request['error'] = str(e)
+            print(f"TTS render error: {e}")
+        request['done'].set()
+        return request['error'] is None
+
+    def _create_engine(self):
+        """Build an engine with the worker's callbacks attached"""
+        engine = self.engine_factory()
+        if engine is None:
+            raise SpeechUnavailable('TTS engine not available')
+        engine.connect('started-utterance', self._on_utterance)
+        engine.connect('started-word', self._on_word)
+        return engine
+
+    def _recover(self):
+        """Replace a failed engine, retrying with backoff until one starts or the worker stops"""
+        delay = self.restart_delay
+        while self._running:
+            self.engine = None
+            try:
+                self.engine = self._create_engine()
+                self.restarts += 1
+                print("TTS engine restarted")
+                return
+            except Exception as e:
+                print(f"TTS engine restart failed: {e}")
+            with self._condition:
+                self._condition.wait(delay)
+            delay = min(delay * 2, self.max_restart_delay)
+
+    def _run(self):
+        """Worker loop: owns the engine and speaks one job at a time"""
+        try:
+            self.engine = self._create_engine()
+            self.available = True
+        except Exception as e:
+            print(f"TTS initialization error: {e}")
+            self.engine = None
+        finally:
+            self._ready.set()
+        if self.engine is None:
+            return
+
+        while True:
+            with self._condition:
+                while self._running and not self._queue:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                _, _, job_id = heapq.heappop(self._queue)
+                request = self._renders.pop(job_id, None)
+                if request is None:
+                    job = self._jobs.get(job_id)
+                    audio = self._audio.pop(job_id, None)
+                    if job is None:
+                        continue
+                    job['status'] = 'speaking'
+                    job['started_at'] = time.time()
+                    self._current = job
+                    self._interrupt = False
+                    self._stopped = False
+                    self._speak_started = time.perf_counter()
+
+            if request is not None:
+                if not self._finish_render(request):
+                    self._recover()
+                continue
+
+            error = None
+            try:
+                text = job['text']
+                if audio is not None and self.player is not None:
+                    audio, text = audio
+                    self._mark_first_audio()
+                    self._play(audio)
+                if text and not self._stopped:
+                    self.engine.say(text)
+                    self.engine.runAndWait()
+            except Exception as e:
+                error = str(e)
+                print(f"TTS error: {e}")
+
+            with self._condition:
+                if error:
+                    job['status'] = 'failed'
+                    job['error'] = error
+                    self.failed += 1
+                elif self._stopped:
+                    job['status'] = 'interrupted'
+                    self.interrupted += 1
+                else:
+                    job['status'] = 'done'
+                    self.spoken += 1
+                job['finished_at'] = time.time()
+                self._current = None
+                self._interrupt = False
+                finished = self._finished.get(job['job_id'])
+            if finished is not None:
+                finished.set()
+            if error:
+                self._recover()
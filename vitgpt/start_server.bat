@@ -4,6 +4,11 @@ echo.
 echo Installing required packages...
 pip install -r requirements.txt
 echo.
-echo Starting Flask server...
-python server.py
+if "%1"=="--production" (
+    echo Starting production ASGI server...
+    python asgi.py
+) else (
+    echo Starting Flask server...
+    python server.py
+)
 pause
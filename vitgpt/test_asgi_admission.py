@@ -0,0 +1,122 @@
+"""
+Admission control under the ASGI server
+Drives /analyze_image past max_active + max_waiting with inference held busy
+and checks the overflow is rejected with 503 straight away instead of
+queueing behind the inference executor.
+
+Run with:  pip install -r requirements-dev.txt && python -m pytest test_asgi_admission.py
+"""
+
+import asyncio
+import io
+import os
+import sys
+import threading
+
+import httpx
+import pytest
+from PIL import Image
+
+sys.argv = sys.argv[:1]  # server.py parses the command line on import
+os.environ['VITGPT_AUTOSTART'] = '0'  # no model loading or speech in tests
+import asgi
+import server
+from admission import AdmissionController
+
+# The server's own limits, so the executor is sized exactly as in production
+MAX_ACTIVE = server.MAX_ACTIVE_REQUESTS
+MAX_WAITING = server.MAX_WAITING_REQUESTS
+
+
+def jpeg(shade):
+    """Small distinct JPEG so no two requests share a stored result"""
+    output = io.BytesIO()
+    Image.new('RGB', (32, 32), (shade, shade, shade)).save(output, 'JPEG')
+    return output.getvalue()
+
+
+@pytest.fixture
+def busy_model(monkeypatch):
+    """A ready model whose inferences each block until the returned semaphore is released once"""
+    gate = threading.Semaphore(0)
+    started = []
+
+    def caption_image(image, deadline=None, lane=None, use_cache=True):
+        started.append(lane)
+        gate.acquire(timeout=10)
+        return 'a test scene', False
+
+    monkeypatch.setattr(server, 'caption_image', caption_image)
+    monkeypatch.setattr(server, 'admission', AdmissionController(
+        max_active=MAX_ACTIVE, max_waiting=MAX_WAITING, lanes=server.LANES))
+    monkeypatch.setattr(server.result_store, 'lookup', lambda key: None)
+    server.model_ready.set()
+    yield gate, started
+    gate.release(100)
+    server.model_ready.clear()
+
+
+def test_overflow_is_rejected_with_503(busy_model):
+    gate, started = busy_model
+    total = MAX_ACTIVE + MAX_WAITING + 3
+    overflow = total - MAX_ACTIVE - MAX_WAITING
+
+    async def run():
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            requests = [
+                asyncio.create_task(client.post(
+                    '/analyze_image', content=jpeg(i * 20), params={'mode': 'scene_description'},
+                    headers={'Content-Type': 'image/jpeg', 'X-Client-Id': f'client-{i}'}))
+                for i in range(total)
+            ]
+            # Overflow must come back while every admitted request is still busy
+            loop = asyncio.get_running_loop()
+            give_up_at = loop.time() + 5
+            while sum(task.done() for task in requests) < overflow and loop.time() < give_up_at:
+                await asyncio.sleep(0.01)
+            early = [task.result().status_code for task in requests if task.done()]
+            queued_in_executor = asgi.executor_backlog()
+            gate.release(total)
+            responses = await asyncio.gather(*requests)
+        return early, queued_in_executor, [response.status_code for response in responses]
+
+    early, queued_in_executor, statuses = asyncio.run(run())
+
+    assert early == [503] * overflow
+    assert queued_in_executor == 0
+    assert statuses.count(200) == MAX_ACTIVE + MAX_WAITING
+    assert statuses.count(503) == overflow
+    assert len(started) == MAX_ACTIVE + MAX_WAITING
+
+
+def test_navigation_overtakes_waiting_scene_description(busy_model):
+    gate, started = busy_model
+
+    async def post(client, i, mode):
+        return await client.post(
+            '/analyze_image', content=jpeg(i * 20), params={'mode': mode},
+            headers={'Content-Type': 'image/jpeg', 'X-Client-Id': f'client-{i}'})
+
+    async def wait_for_started(count):
+        while len(started) < count:
+            await asyncio.sleep(0.01)
+
+    async def run():
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            busy = [asyncio.create_task(post(client, i, 'scene_description')) for i in range(MAX_ACTIVE)]
+            await wait_for_started(MAX_ACTIVE)
+            scene = asyncio.create_task(post(client, MAX_ACTIVE, 'scene_description'))
+            await asyncio.sleep(0.05)
+            navigation = asyncio.create_task(post(client, MAX_ACTIVE + 1, 'navigation'))
+            await asyncio.sleep(0.05)
+            # Free one slot: the later navigation request must get it
+            gate.release()
+            await asyncio.wait_for(wait_for_started(MAX_ACTIVE + 1), 5)
+            gate.release(MAX_ACTIVE + 1)
+            await asyncio.gather(*busy, scene, navigation)
+
+    asyncio.run(run())
+
+    assert started[MAX_ACTIVE:] == ['navigation', 'scene_description']
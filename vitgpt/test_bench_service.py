@@ -0,0 +1,113 @@
+"""
+Load benchmark against the Flask server
+Checks that concurrent benchmark senders each get their own admission client
+id, so the service queues them instead of superseding one with another.
+
+Run with:  python -m pytest test_bench_service.py
+"""
+
+import io
+import os
+import sys
+import threading
+import time
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+
+import pytest
+from PIL import Image
+from werkzeug.serving import make_server
+
+sys.argv = sys.argv[:1]  # server.py parses the command line on import
+os.environ['VITGPT_AUTOSTART'] = '0'  # no model loading or speech in tests
+import bench_service
+import server
+from admission import AdmissionController
+
+CONCURRENCY = 6
+MAX_ACTIVE = 2
+
+
+def jpeg(shade):
+    output = io.BytesIO()
+    Image.new('RGB', (32, 32), (shade, shade, shade)).save(output, 'JPEG')
+    return output.getvalue()
+
+
+@pytest.fixture
+def service_url(monkeypatch):
+    """A running Flask server with a slow model and room for every sender to wait"""
+    client_ids = set()
+    request_admission = server.request_admission
+
+    def recording_admission(headers, remote_addr):
+        client_id, deadline = request_admission(headers, remote_addr)
+        client_ids.add(client_id)
+        return client_id, deadline
+
+    def caption_image(image, deadline=None, lane=None, use_cache=True):
+        time.sleep(0.05)
+        return 'a test scene', False
+
+    monkeypatch.setattr(server, 'caption_image', caption_image)
+    monkeypatch.setattr(server, 'request_admission', recording_admission)
+    monkeypatch.setattr(server, 'admission', AdmissionController(
+        max_active=MAX_ACTIVE, max_waiting=CONCURRENCY, lanes=server.LANES))
+    server.model_ready.set()
+    httpd = make_server('127.0.0.1', 0, server.app, threaded=True)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{httpd.server_port}', client_ids
+    httpd.shutdown()
+    server.model_ready.clear()
+
+
+def test_concurrent_senders_are_not_superseded(service_url):
+    url, client_ids = service_url
+    client = bench_service.Client(url, raw=True)
+    frames = [(f'{i}.jpg', jpeg(i * 30)) for i in range(4)]
+
+    records = bench_service.run_closed_loop(client, frames, 'scene_description', CONCURRENCY, 30, 30)
+    summary = bench_service.summarise(records, 1.0)
+
+    assert summary['rejected'] == {'superseded_429': 0, 'queue_full_503': 0}
+    assert summary['succeeded'] == 30
+    assert len(client_ids) == CONCURRENCY
+
+
+def test_caption_cache_hits_count_as_cached(monkeypatch):
+    """A near-duplicate frame answered from the dHash caption cache is reported as cached"""
+    class Batcher:
+        def caption(self, image, **kwargs):
+            return [{'generated_text': 'a test scene'}]
+
+    monkeypatch.setattr(server, 'batcher', Batcher())
+    monkeypatch.setattr(server, 'admission', AdmissionController(lanes=server.LANES))
+    server.model_ready.set()
+    try:
+        client = server.app.test_client()
+        # Different bytes, so the exact-match result store misses, but the same picture
+        cached = [client.post('/analyze_image', data=jpeg(100)[:-2] + suffix,
+                              headers={'Content-Type': 'image/jpeg'}).get_json()['cached']
+                  for suffix in (b'\xff\xd9', b'\xff\xd9\x00')]
+    finally:
+        server.model_ready.clear()
+
+    assert cached == [False, True]
+
+
+def test_batch_timeout_is_reported_as_504(monkeypatch):
+    """A batch scheduler timeout is a gateway timeout, not an internal error"""
+    class Batcher:
+        def caption(self, image, **kwargs):
+            raise FuturesTimeoutError()
+
+    monkeypatch.setattr(server, 'batcher', Batcher())
+    monkeypatch.setattr(server, 'admission', AdmissionController(lanes=server.LANES))
+    server.model_ready.set()
+    try:
+        # no-cache, so an earlier test's caption for a similar frame is not reused
+        response = server.app.test_client().post('/analyze_image', data=jpeg(200),
+                                                 headers={'Content-Type': 'image/jpeg', 'Cache-Control': 'no-cache'})
+    finally:
+        server.model_ready.clear()
+
+    assert response.status_code == 504
@@ -0,0 +1,64 @@
+"""
+Interrupting cached audio
+Plays a pre-rendered description through a player that never finishes on its
+own and checks that a hazard cuts it off and is spoken straight away.
+
+Run with:  python -m pytest test_speech_worker.py
+"""
+
+import threading
+
+from speech_worker import SpeechWorker
+
+
+class Engine:
+    """Stand-in for a pyttsx3 engine that records what it says"""
+
+    def __init__(self):
+        self.said = []
+
+    def connect(self, topic, callback):
+        pass
+
+    def say(self, text):
+        self.said.append(text)
+
+    def runAndWait(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class Playback:
+    """Cached clip that keeps playing until stopped"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.stopped = threading.Event()
+
+    def wait(self, timeout=None):
+        self.started.set()
+        return self.stopped.wait(timeout)
+
+    def stop(self):
+        self.stopped.set()
+
+
+def test_hazard_interrupts_cached_audio():
+    engine = Engine()
+    playback = Playback()
+    worker = SpeechWorker(lambda: engine, player=lambda audio: playback).start()
+    try:
+        description = worker.submit('Scene description: a park', audio=b'RIFF', remainder='')
+        assert playback.started.wait(5)
+
+        hazard = worker.speak('Stop, car ahead', priority='hazard', timeout=5)
+    finally:
+        playback.stop()
+        worker.stop()
+
+    assert playback.stopped.is_set()
+    assert worker.status(description['job_id'])['status'] == 'interrupted'
+    assert hazard['status'] == 'done'
+    assert engine.said == ['Stop, car ahead']
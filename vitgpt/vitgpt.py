@@ -1,13 +1,38 @@
 import cv2
+import os
+import threading
 import time
 import pyttsx3
-import requests
-import numpy as np
-from PIL import Image
-from transformers import pipeline
+from caption_cache import CaptionCache, dhash
+from scene_change import SceneChangeDetector
+from preprocess import MODEL_INPUT_SIZE, decode_frame, frame_to_image
+from mjpeg_stream import MJPEGStreamSource
+from pipeline import Pipeline
+from capture_client import CaptureClient, CaptureError
+from speech_worker import SpeechUnavailable, SpeechWorker
+from audio_cache import AudioCache, wav_player
+from backends import BACKENDS, MODEL_NAME, load_backend
 
-# Load image captioning model
-pipe = pipeline("image-to-text", model="nlpconnect/vit-gpt2-image-captioning")
+# Load image captioning model; the backend normalises frames with the numpy fast
+# path and calls generate directly instead of going through pipeline("image-to-text")
+BACKEND = os.environ.get('VITGPT_BACKEND', 'pytorch')
+if BACKEND not in BACKENDS:
+    print(f"Unknown VITGPT_BACKEND '{BACKEND}', expected one of: {', '.join(BACKENDS)}")
+    exit()
+captioner = load_backend(BACKEND, MODEL_NAME)
+
+# Reuse captions for near-identical frames instead of re-running the model
+caption_cache = CaptionCache(max_entries=64, max_distance=5, ttl_seconds=30.0)
+
+# Scene-change gating: skip the model unless the view changed or the caption is stale
+SCENE_CHANGE_THRESHOLD = 0.04  # lower is more sensitive
+SCENE_CHANGE_METHOD = 'diff'   # 'diff' or 'histogram'
+MAX_CAPTION_STALENESS = 10.0   # seconds
+scene_detector = SceneChangeDetector(
+    threshold=SCENE_CHANGE_THRESHOLD,
+    max_staleness=MAX_CAPTION_STALENESS,
+    method=SCENE_CHANGE_METHOD,
+)
 
 # Initialize text-to-speech engine with proper setup function
 def initialize_tts_engine():
@@ -28,48 +53,70 @@ def initialize_tts_engine():
     
     return engine
 
+# One long-lived engine, configured once and re-created only if the driver fails
+speech_worker = SpeechWorker(initialize_tts_engine, player=wav_player()).start()
+
+# Announcements repeat, so render them once and play the audio instead of synthesising again
+UNCLEAR_ANNOUNCEMENT = "Unable to analyze current image"
+SCENE_PREFIX = "Scene description:"
+audio_cache = AudioCache(speech_worker.render, prefixes=[SCENE_PREFIX])
+
+if speech_worker.available and speech_worker.player is not None:
+    threading.Thread(target=audio_cache.preload, args=([UNCLEAR_ANNOUNCEMENT],),
+                     name='audio-prerender', daemon=True).start()
+
 def speak_text(text):
-    """Speak text using a fresh TTS engine instance"""
+    """Speak text on the persistent TTS engine and wait until it finishes"""
+    # Cached audio covers the whole phrase or its prefix; the engine speaks the rest
+    audio, remainder = audio_cache.lookup(text) if speech_worker.player is not None else (None, None)
     try:
-        # Create a new engine instance for each speech
-        engine = initialize_tts_engine()
-        engine.say(text)
-        engine.runAndWait()
-        engine.stop()
-        # Clean up
-        del engine
-        return True
-    except Exception as e:
+        job = speech_worker.speak(text, audio=audio, remainder=remainder)
+    except SpeechUnavailable as e:
         print(f"TTS Error: {e}")
         return False
+    if job['status'] != 'done':
+        print(f"TTS Error: {job['error'] or job['status']}")
+        return False
+    print(f"Time to first audio: {job['time_to_first_audio_ms']}ms")
+    return True
 
-ESP32_CAPTURE_URL = "http://192.168.0.144/capture"
-
-def capture_image_from_url(url, timeout=10, max_retries=3):
-    for attempt in range(max_retries):
-        try:
-            print(f"Capturing image (attempt {attempt + 1}/{max_retries})...")
-            response = requests.get(url, timeout=timeout)
-            if response.status_code == 200:
-                image_array = np.frombuffer(response.content, np.uint8)
-                frame = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
-                if frame is not None:
-                    print("Successfully captured image from ESP32")
-                    return frame
-                else:
-                    print("Failed to decode image")
-            else:
-                print(f"HTTP Error: {response.status_code}")
-        except requests.exceptions.Timeout:
-            print(f"Timeout occurred (attempt {attempt + 1})")
-        except requests.exceptions.ConnectionError:
-            print(f"Connection error (attempt {attempt + 1})")
-        except Exception as e:
-            print(f"Error capturing image: {e}")
-        if attempt < max_retries - 1:
-            print("Retrying in 2 seconds...")
-            time.sleep(2)
-    return None
+# Point these at esp32_emulator.py (e.g. http://localhost:8080/capture) to run without hardware
+ESP32_CAPTURE_URL = os.environ.get('VITGPT_ESP32_CAPTURE_URL', "http://192.168.0.144/capture")
+# The firmware serves /stream from a second HTTP server on port 81
+ESP32_STREAM_URL = os.environ.get('VITGPT_ESP32_STREAM_URL', "http://192.168.0.144:81/stream")
+USE_STREAM = True  # False falls back to one /capture request per frame
+STREAM_FALLBACK_AFTER = 3  # failed stream connections before switching to /capture polling
+
+# Keep-alive connections, hedged requests and jittered backoff for /capture
+capture_client = CaptureClient(connect_timeout=2.0, read_timeout=5.0, max_retries=3)
+
+def capture_image_from_url(url):
+    try:
+        data = capture_client.get(url)
+    except CaptureError as e:
+        print(f"Error capturing image: {e}")
+        return None
+    # Decode at a reduced scale close to the model input size
+    frame = decode_frame(data, MODEL_INPUT_SIZE)
+    if frame is None:
+        print("Failed to decode image")
+    return frame
+
+def next_frame(timeout=15):
+    """Newest frame from the MJPEG stream, or a fresh /capture when not streaming"""
+    global frame_source
+    if frame_source is not None and frame_source.connect_failures >= STREAM_FALLBACK_AFTER:
+        print(f"MJPEG stream failed {frame_source.connect_failures} times ({frame_source.last_error}); "
+              "falling back to /capture polling")
+        frame_source.stop()
+        frame_source = None
+    if frame_source is None:
+        return capture_image_from_url(ESP32_CAPTURE_URL)
+    data = frame_source.read_frame(timeout=timeout)
+    if data is None:
+        print("No frame received from stream")
+        return None
+    return decode_frame(data, MODEL_INPUT_SIZE)
 
 # Test initial connection
 print("Testing ESP32 camera connection...")
@@ -79,6 +126,10 @@ if test_frame is None:
     exit()
 
 print("ESP32 camera connected successfully!")
+
+# One long-lived MJPEG connection instead of a new request per frame
+frame_source = MJPEGStreamSource(ESP32_STREAM_URL).start() if USE_STREAM else None
+
 print("Starting image capture and analysis. Press Ctrl+C to quit.")
 print("Audio announcements will play every 3 captured images.")
 print("System ready for visual assistance.")
@@ -87,73 +138,135 @@ capture_count = 0
 failed_captures = 0
 max_failed_captures = 5
 tts_announcement_interval = 3  # Announce every 3rd caption
+CAPTURE_INTERVAL = 0.2  # seconds between captures
+STATS_INTERVAL = 30.0   # seconds between stage timing reports
+
+def capture_stage():
+    """Capture stage: fetch the next frame, backing off after repeated failures"""
+    global failed_captures
+    frame = next_frame(timeout=15)
+    
+    if frame is None:
+        failed_captures += 1
+        print(f"Failed to capture image ({failed_captures}/{max_failed_captures})")
+        if failed_captures >= max_failed_captures:
+            print("Too many failed captures. Retrying in 5 seconds...")
+            time.sleep(5)
+            failed_captures = 0
+        else:
+            time.sleep(2)
+        return None
+    
+    failed_captures = 0
+    return frame
+
+def inference_stage(frame):
+    """Inference stage: caption changed scenes and pass due announcements to speech"""
+    global capture_count
+    if not scene_detector.should_analyze(frame):
+        print(f"No scene change (score {scene_detector.last_score:.3f}), skipping analysis")
+        return None
+    
+    capture_count += 1
+    announce = capture_count % tts_announcement_interval == 0
+    
+    try:
+        print(f"Analyzing captured image #{capture_count}...")
+        pil_image = frame_to_image(frame)
+        image_hash = dhash(pil_image)
+        result = caption_cache.lookup(image_hash)
+        if result is None:
+            result = captioner([pil_image])[0]
+            if result and len(result) > 0 and 'generated_text' in result[0]:
+                caption_cache.store(image_hash, result)
+        else:
+            print("Scene unchanged, reusing cached caption")
+        
+        caption = None
+        if result and len(result) > 0 and 'generated_text' in result[0]:
+            caption = result[0]['generated_text']
+            print(f"Caption (capture #{capture_count}): {caption}")
+        else:
+            print("No caption generated")
+            caption = "Scene unclear or image processing failed"
+        
+        # Always announce every 3rd capture
+        if announce:
+            print(f"Queueing caption for speech (announcement #{capture_count // tts_announcement_interval})...")
+            # Create accessibility-friendly announcement
+            return f"{SCENE_PREFIX} {caption}"
+        
+        remaining = tts_announcement_interval - (capture_count % tts_announcement_interval)
+        print(f"Caption displayed (audio in {remaining} capture(s))")
+        return None
+    
+    except Exception as e:
+        print(f"Error analyzing image: {e}")
+        return UNCLEAR_ANNOUNCEMENT if announce else None
+
+def speech_stage(text):
+    """Speech stage: speak announcements while capture and inference carry on"""
+    if speak_text(text):
+        print("Finished speaking announcement")
+    else:
+        print("Failed to speak announcement")
+    return None
 
+def print_stage_stats(stats):
+    """Print per-stage timings, queue drop counts, capture, speech and audio cache counters"""
+    print("Pipeline stage timings:")
+    for name, timing in stats['stages'].items():
+        print(f"   {name:<10} n={timing['count']:<5} mean={timing['mean_ms']}ms "
+              f"p95={timing['p95_ms']}ms errors={timing['errors']}")
+    for name, q in stats['queues'].items():
+        print(f"   queue {name:<10} depth={q['depth']} dropped={q['dropped']}")
+    capture = capture_client.stats()
+    print(f"   capture    requests={capture['requests_sent']} hedges={capture['hedges_sent']} "
+          f"hedge_wins={capture['hedge_wins']} retries={capture['retries']} "
+          f"p95={capture['latency_p95_ms']}ms")
+    speech = speech_worker.stats()
+    print(f"   speech     spoken={speech['spoken']} failed={speech['failed']} restarts={speech['restarts']} "
+          f"first_audio_mean={speech['time_to_first_audio_mean_ms']}ms "
+          f"p95={speech['time_to_first_audio_p95_ms']}ms")
+    audio = audio_cache.stats()
+    print(f"   audio      hits={audio['hits']} prefix_hits={audio['prefix_hits']} misses={audio['misses']} "
+          f"entries={audio['entries']}")
+
+# Capture -> inference -> speech, joined by drop-oldest queues so a slow stage
+# only ever sees the newest work; the display stays on the main (GUI) thread
+pipeline = Pipeline()
+frames_queue = pipeline.queue('frames', maxsize=1)
+display_queue = pipeline.queue('display', maxsize=1)
+speech_queue = pipeline.queue('speech', maxsize=1)
+pipeline.stage('capture', capture_stage, outboxes=[frames_queue, display_queue], interval=CAPTURE_INTERVAL)
+pipeline.stage('inference', inference_stage, inbox=frames_queue, outboxes=[speech_queue])
+pipeline.stage('speech', speech_stage, inbox=speech_queue)
+pipeline.start()
+
+last_stats = time.monotonic()
 try:
     while True:
-        frame = capture_image_from_url(ESP32_CAPTURE_URL, timeout=15)
-        
-        if frame is None:
-            failed_captures += 1
-            print(f"Failed to capture image ({failed_captures}/{max_failed_captures})")
-            if failed_captures >= max_failed_captures:
-                print("Too many failed captures. Retrying in 5 seconds...")
-                time.sleep(5)
-                failed_captures = 0
-            else:
-                time.sleep(2)
-            continue
-
-        failed_captures = 0
-        capture_count += 1
-        cv2.imshow("ESP32 Captured Image", frame)
-
-        try:
-            print(f"Analyzing captured image #{capture_count}...")
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            pil_image = Image.fromarray(rgb_frame)
-            result = pipe(pil_image)
-
-            caption = None
-            if result and len(result) > 0 and 'generated_text' in result[0]:
-                caption = result[0]['generated_text']
-                print(f"Caption (capture #{capture_count}): {caption}")
-            else:
-                print("No caption generated")
-                caption = "Scene unclear or image processing failed"
-
-            # Always announce every 3rd capture
-            if capture_count % tts_announcement_interval == 0:
-                print(f"Speaking caption (announcement #{capture_count // tts_announcement_interval})...")
-                # Create accessibility-friendly announcement
-                accessible_text = f"Scene description: {caption}"
-                success = speak_text(accessible_text)
-                if success:
-                    print("Finished speaking caption")
-                else:
-                    print("Failed to speak caption")
-            else:
-                remaining = tts_announcement_interval - (capture_count % tts_announcement_interval)
-                print(f"Caption displayed (audio in {remaining} capture(s))")
-
-        except Exception as e:
-            print(f"Error analyzing image: {e}")
-            if capture_count % tts_announcement_interval == 0:
-                success = speak_text("Unable to analyze current image")
-                if success:
-                    print("Finished speaking error message")
-                else:
-                    print("Failed to speak error message")
-
-        # Wait before next capture
-        time.sleep(0.5)
+        frame = display_queue.get(timeout=0.05)
+        if frame is not None:
+            cv2.imshow("ESP32 Captured Image", frame)
 
         key = cv2.waitKey(1) & 0xFF
         if key == ord('q'):
             break
 
+        if time.monotonic() - last_stats >= STATS_INTERVAL:
+            print_stage_stats(pipeline.stats())
+            last_stats = time.monotonic()
+
 except KeyboardInterrupt:
     print("\nProgram interrupted by user")
 
 print("Cleaning up...")
+pipeline.stop()
+print_stage_stats(pipeline.stats())
+if frame_source is not None:
+    frame_source.stop()
+capture_client.close()
+speech_worker.stop()
 cv2.destroyAllWindows()
 print("Goodbye!")
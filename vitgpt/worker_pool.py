@@ -0,0 +1,190 @@
+"""
+Multi-process inference worker pool
+The model is loaded once in the parent process and its weights are moved to
+shared memory, so each worker reuses the same tensors instead of holding its
+own copy. Workers are spawned rather than forked: the server already runs
+threads (model loader, speech worker, batcher) whose locks a fork would copy
+mid-use. Batches go to whichever worker has the least work.
+A worker that dies fails its in-flight batches and is replaced.
+"""
+
+import itertools
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import Future
+
+# Seconds between checks that every worker process is still alive
+WATCH_INTERVAL = 0.5
+
+
+def _worker_main(worker_id, infer_fn, threads, tasks, results):
+    """Worker process loop: run batches from the task queue until told to stop"""
+    # Ctrl+C is handled by the parent, which terminates the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        job_id, images = task
+        try:
+            results.put((job_id, worker_id, infer_fn(images), None))
+        except Exception as e:
+            results.put((job_id, worker_id, None, f"{type(e).__name__}: {e}"))
+
+
+class InferenceWorkerPool:
+    """Dispatch inference batches to spawned worker processes sharing one set of weights"""
+
+    def __init__(self, infer_fn, model=None, num_workers=2, threads_per_worker=1, result_timeout=None):
+        """
+        infer_fn:           picklable callable run inside the workers on a list of images
+        model:              torch module whose weights are moved to shared memory
+        num_workers:        number of worker processes
+        threads_per_worker: torch intra-op threads in each worker
+        result_timeout:     seconds caption_batch waits for a worker before giving up
+        """
+        if model is not None:
+            # Weights in shared memory are passed to the workers by handle, not copied
+            import torch.multiprocessing  # registers the shared tensor pickling
+            model.share_memory()
+
+        self.infer_fn = infer_fn
+        self.threads_per_worker = max(1, int(threads_per_worker))
+        self.result_timeout = result_timeout
+        self._ctx = multiprocessing.get_context('spawn')
+        self._results = self._ctx.Queue()
+        self._lock = threading.Lock()
+        self._job_ids = itertools.count()
+        self._pending = {}  # job_id -> (worker_id, future)
+        self._closing = False
+        self.restarts = 0
+
+        self._workers = [self._start_worker(worker_id) for worker_id in range(max(1, int(num_workers)))]
+
+        self._collector = threading.Thread(target=self._collect, name='worker-pool-results', daemon=True)
+        self._collector.start()
+        print(f"Started {len(self._workers)} inference workers "
+              f"({self.threads_per_worker} thread(s) each, parent pid {os.getpid()})")
+
+    def _start_worker(self, worker_id):
+        """Start one worker process and return its bookkeeping dict"""
+        tasks = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self.infer_fn, self.threads_per_worker, tasks, self._results),
+            name=f'inference-worker-{worker_id}',
+            daemon=True,
+        )
+        process.start()
+        return {'process': process, 'tasks': tasks, 'inflight': 0, 'completed': 0}
+
+    @property
+    def size(self):
+        return len(self._workers)
+
+    def submit(self, images):
+        """Send a batch to the least loaded live worker and return a Future"""
+        future = Future()
+        with self._lock:
+            alive = [i for i, w in enumerate(self._workers) if w['process'].is_alive()]
+            if not alive:
+                raise RuntimeError("No inference workers are running")
+            worker_id = min(alive, key=lambda i: self._workers[i]['inflight'])
+            job_id = next(self._job_ids)
+            self._pending[job_id] = (worker_id, future)
+            self._workers[worker_id]['inflight'] += 1
+        self._workers[worker_id]['tasks'].put((job_id, images))
+        return future
+
+    def caption_batch(self, images, timeout=None):
+        """Caption a list of images on a worker, blocking until it finishes or the timeout passes"""
+        return self.submit(images).result(timeout if timeout is not None else self.result_timeout)
+
+    def stats(self):
+        """Per-worker load counters for monitoring"""
+        with self._lock:
+            return {
+                'workers': [
+                    {
+                        'pid': w['process'].pid,
+                        'alive': w['process'].is_alive(),
+                        'inflight': w['inflight'],
+                        'completed': w['completed'],
+                    }
+                    for w in self._workers
+                ],
+                'threads_per_worker': self.threads_per_worker,
+                'restarts': self.restarts,
+            }
+
+    def shutdown(self):
+        """Ask the workers to exit and wait for them"""
+        self._closing = True
+        for worker in self._workers:
+            worker['tasks'].put(None)
+        for worker in self._workers:
+            worker['process'].join(timeout=5)
+            if worker['process'].is_alive():
+                worker['process'].terminate()
+
+    def _collect(self):
+        """Resolve futures as workers report results, and replace workers that die"""
+        last_check = time.monotonic()
+        while True:
+            try:
+                job_id, worker_id, output, error = self._results.get(timeout=WATCH_INTERVAL)
+            except queue.Empty:
+                job_id = None
+            if job_id is not None:
+                self._resolve(job_id, worker_id, output, error)
+            if time.monotonic() - last_check >= WATCH_INTERVAL:
+                last_check = time.monotonic()
+                self._replace_dead_workers()
+
+    def _resolve(self, job_id, worker_id, output, error):
+        with self._lock:
+            entry = self._pending.pop(job_id, None)
+            if entry is None:
+                return  # already failed when its worker was found dead
+            _, future = entry
+            worker = self._workers[worker_id]
+            worker['inflight'] -= 1
+            worker['completed'] += 1
+        if error is None:
+            future.set_result(output)
+        else:
+            future.set_exception(RuntimeError(f"Inference worker {worker_id} failed: {error}"))
+
+    def _replace_dead_workers(self):
+        """Fail the batches of any worker that exited unexpectedly and start a new one in its place"""
+        if self._closing:
+            return
+        failed = []
+        with self._lock:
+            for worker_id, worker in enumerate(self._workers):
+                process = worker['process']
+                if process.is_alive():
+                    continue
+                failed.extend((job_id, future, process.exitcode) for job_id, (owner, future)
+                              in self._pending.items() if owner == worker_id)
+                for job_id, _, _ in failed:
+                    self._pending.pop(job_id, None)
+                print(f"Inference worker {worker_id} (pid {process.pid}) died with exit code "
+                      f"{process.exitcode}; restarting it")
+                worker['tasks'].cancel_join_thread()
+                worker['tasks'].close()
+                self._workers[worker_id] = self._start_worker(worker_id)
+                self.restarts += 1
+        for _, future, exitcode in failed:
+            if not future.done():
+                future.set_exception(RuntimeError(f"Inference worker died (exit code {exitcode})"))